@@ -301,13 +301,15 @@ def validate_claude_code_auth() -> Tuple[bool, Dict[str, Any]]:
     Validate Claude Code authentication and return status.
     Returns (is_valid, status_info)
     """
+    # auth_status is computed once when the manager is created, so this is a
+    # plain lookup; keep the per-request success message at debug level
     status = auth_manager.auth_status
     
     if not status["valid"]:
         logger.error(f"Claude Code authentication failed: {status['errors']}")
         return False, status
     
-    logger.info(f"Claude Code authentication validated: {status['method']}")
+    logger.debug("Claude Code authentication validated: %s", status['method'])
     return True, status
 
 
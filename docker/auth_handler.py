@@ -5,13 +5,21 @@ Monitors for authentication needs and automates the browser login flow.
 """
 
 import os
-import time
+import shutil
+import signal
 import subprocess
+import sys
 import logging
 from pathlib import Path
 import json
 import asyncio
-from typing import Optional
+from typing import Optional, Tuple
+
+try:
+    from watchfiles import Change, awatch
+except ImportError:  # watchfiles ships with uvicorn[standard]; fall back to polling without it
+    Change = None
+    awatch = None
 
 # Configure logging
 logging.basicConfig(
@@ -20,198 +28,410 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _exists(path: str) -> bool:
+    """Cheap existence check: a single lstat without following symlinks."""
+    try:
+        os.lstat(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def find_process(name: str) -> Optional[int]:
+    """Return the pid of the first process whose comm matches name, scanning /proc in-process."""
+    # comm is at most 15 bytes plus a trailing newline
+    wanted = name.encode()[:15] + b"\n"
+    with os.scandir("/proc") as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/comm", "rb") as f:
+                    if f.read(16) == wanted:
+                        return int(entry.name)
+            except OSError:
+                continue
+    return None
+
+async def wait_for_exit(pid: int, timeout: float) -> bool:
+    """Wait up to timeout seconds for pid to exit. Returns True if it exited."""
+    try:
+        pidfd = os.pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    except (AttributeError, OSError):
+        # pidfd_open needs Linux 5.3+; fall back to a plain sleep
+        await asyncio.sleep(timeout)
+        return False
+    
+    # A pidfd becomes readable when the process exits
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(True))
+    try:
+        await asyncio.wait_for(exited, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+
 class DockerAuthHandler:
     def __init__(self):
         self.config_dir = Path("/config/claude")
         self.auth_verified_file = self.config_dir / ".auth_verified"
         self.need_auth_file = Path("/tmp/need_auth")
+        self._auth_verified_str = str(self.auth_verified_file)
+        self._need_auth_str = str(self.need_auth_file)
+        self._claude_config_src = Path.home() / ".config" / "claude"
+        self._claude_config_dst = self.config_dir / ".claude_auth"
         self.display = os.environ.get("DISPLAY", ":1")
+        self._auth_method = os.environ.get("AUTH_METHOD")
+        self._env = {**os.environ, "DISPLAY": self.display}
+        self._marker_names = {self.auth_verified_file.name, self.need_auth_file.name}
+        self._version_cache: Optional[Tuple[int, int, bool]] = None
+        self._auth_process: Optional[asyncio.subprocess.Process] = None
+    
+    async def _claude_ok(self, timeout: float) -> bool:
+        """Check that claude CLI works, reusing the last result while its binary and config are unchanged."""
+        claude_path = shutil.which("claude")
+        if claude_path is None:
+            return False
+        
+        try:
+            config_mtime = os.stat(self._claude_config_src).st_mtime_ns
+        except FileNotFoundError:
+            config_mtime = 0
+        key = (os.stat(claude_path).st_mtime_ns, config_mtime)
+        
+        if self._version_cache is not None and self._version_cache[:2] == key:
+            return self._version_cache[2]
         
-    def check_auth_needed(self) -> bool:
+        healthy = await self._claude_healthy(timeout)
+        self._version_cache = (*key, healthy)
+        return healthy
+    
+    async def _claude_healthy(self, timeout: float = 5) -> bool:
+        """Run 'claude --version' and report whether it succeeded."""
+        proc = await asyncio.create_subprocess_exec(
+            "claude", "--version",
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()  # reap it so no zombie is left behind
+            raise
+        return proc.returncode == 0
+        
+    async def check_auth_needed(self) -> bool:
         """Check if authentication is needed."""
-        # Check if we're using browser auth
-        if os.environ.get("AUTH_METHOD") != "browser":
-            logger.info("Not using browser authentication method")
+        # Check if auth is already verified - the steady state, so test it first
+        if _exists(self._auth_verified_str):
+            logger.debug("Authentication already verified")
             return False
             
-        # Check if auth is already verified
-        if self.auth_verified_file.exists():
-            logger.info("Authentication already verified")
+        # Check if we're using browser auth
+        if self._auth_method != "browser":
+            logger.info("Not using browser authentication method")
             return False
             
         # Check if auth is needed
-        if self.need_auth_file.exists():
+        if _exists(self._need_auth_str):
             return True
             
         # Try to verify Claude CLI auth
         try:
-            result = subprocess.run(
-                ["claude", "--version"],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            if result.returncode == 0:
+            if await self._claude_ok(timeout=10):
                 logger.info("Claude CLI is working")
                 self.auth_verified_file.touch()
                 return False
         except Exception as e:
-            logger.error(f"Error checking Claude CLI: {e}")
+            logger.error("Error checking Claude CLI: %s", e)
             
         return True
     
-    def wait_for_desktop(self, max_wait: int = 30):
+    async def wait_for_desktop(self, max_wait: int = 30):
         """Wait for desktop environment to be ready."""
         logger.info("Waiting for desktop environment...")
-        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait
         
-        while time.time() - start_time < max_wait:
+        while loop.time() < deadline:
             try:
                 # Check if XFCE is running
-                result = subprocess.run(
-                    ["pgrep", "-f", "xfce4-session"],
-                    capture_output=True
-                )
-                if result.returncode == 0:
-                    logger.info("Desktop environment is ready")
-                    time.sleep(2)  # Give it a bit more time to fully start
-                    return True
+                pid = find_process("xfce4-session")
+                if pid is not None:
+                    # Give it a bit more time to fully start, unless it exits meanwhile
+                    if not await wait_for_exit(pid, 2):
+                        logger.info("Desktop environment is ready")
+                        return True
+                    logger.debug("Desktop session exited during startup, waiting again")
+                    continue
             except Exception as e:
-                logger.debug(f"Desktop check error: {e}")
+                logger.debug("Desktop check error: %s", e)
             
-            time.sleep(1)
+            await asyncio.sleep(1)
         
         logger.warning("Desktop environment did not start in time")
         return False
     
-    def launch_browser_for_auth(self):
+    async def launch_browser_for_auth(self):
         """Launch Firefox for Claude authentication."""
         logger.info("Launching browser for authentication...")
         
         try:
-            # Set display
-            env = os.environ.copy()
-            env["DISPLAY"] = self.display
+            env = self._env
             
             # First, try to run claude auth login to get the URL
             logger.info("Running claude auth login...")
-            auth_process = subprocess.Popen(
-                ["claude", "auth", "login"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
+            auth_process = await asyncio.create_subprocess_exec(
+                "claude", "auth", "login",
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
                 env=env
             )
+            self._auth_process = auth_process
             
             # Wait a bit for the process to output the URL
-            time.sleep(2)
-            
-            # Try to launch a browser
-            browsers = ["firefox", "chromium-browser", "google-chrome"]
-            browser_launched = False
+            await asyncio.sleep(2)
             
-            for browser in browsers:
-                try:
-                    logger.info(f"Trying to open {browser}...")
-                    subprocess.Popen(
-                        [browser, "--new-window"],
-                        env=env,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
-                    )
-                    browser_launched = True
-                    logger.info(f"Successfully launched {browser}")
-                    break
-                except FileNotFoundError:
-                    logger.warning(f"{browser} not found, trying next...")
-                except Exception as e:
-                    logger.warning(f"Error launching {browser}: {e}")
-            
-            if not browser_launched:
+            # Resolve a browser up front and launch only that one
+            browser = next(
+                (b for b in ("firefox", "chromium-browser", "google-chrome") if shutil.which(b)),
+                None
+            )
+            if browser is None:
                 logger.error("No browser could be launched! Please install Firefox or Chromium.")
                 return False
             
+            logger.info("Opening %s...", browser)
+            await asyncio.create_subprocess_exec(
+                browser, "--new-window",
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            logger.info("Successfully launched %s", browser)
+            
             # Monitor for successful authentication
             logger.info("Waiting for authentication to complete...")
             logger.info("Please complete the login in the browser window")
             
-            # Check periodically if auth is successful
-            for i in range(300):  # Wait up to 5 minutes
-                time.sleep(1)
-                
-                # Check if claude CLI now works
-                try:
-                    result = subprocess.run(
-                        ["claude", "--version"],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if result.returncode == 0:
-                        logger.info("Authentication successful!")
-                        self.save_auth_state()
-                        self.auth_verified_file.touch()
-                        if self.need_auth_file.exists():
-                            self.need_auth_file.unlink()
-                        return True
-                except Exception:
-                    pass
-                
-                if i % 30 == 0:
-                    logger.info(f"Still waiting for authentication... ({i}/300 seconds)")
+            if not await self.wait_for_login(auth_process):
+                logger.error("Authentication timeout - please try again")
+                auth_process.terminate()
+                await auth_process.wait()
+                return False
             
-            logger.error("Authentication timeout - please try again")
+            # Check once that claude CLI now works, bypassing the cache since the
+            # login may change state the cache key does not capture
+            try:
+                if await self._claude_healthy(timeout=5):
+                    logger.info("Authentication successful!")
+                    await self.save_auth_state()
+                    self.auth_verified_file.touch()
+                    self.need_auth_file.unlink(missing_ok=True)
+                    return True
+            except Exception:
+                pass
+            
+            logger.error("Authentication failed - claude CLI is still not working")
             return False
             
         except Exception as e:
-            logger.error(f"Error launching browser: {e}")
+            logger.error("Error launching browser: %s", e)
             return False
     
-    def save_auth_state(self):
+    async def wait_for_credentials(self):
+        """Return once claude writes a credentials file into its config dir."""
+        # Don't create the config dir here: save_auth_state treats its existence
+        # as the sign that claude wrote something. Until it exists, watch the
+        # nearest existing ancestor for the next missing level to appear.
+        while not self._claude_config_src.is_dir():
+            watched = self._claude_config_src.parent
+            while not watched.is_dir():
+                watched = watched.parent
+            next_level = str(watched / self._claude_config_src.relative_to(watched).parts[0])
+            # The timeout re-checks, in case the level appeared before the watch was armed
+            async for _ in awatch(
+                watched,
+                watch_filter=lambda change, path: change != Change.deleted and path == next_level,
+                recursive=False,
+                rust_timeout=5000,
+                yield_on_timeout=True
+            ):
+                break
+        
+        async for _ in awatch(
+            self._claude_config_src,
+            watch_filter=lambda change, path: change != Change.deleted and path.endswith("credentials.json")
+        ):
+            return
+    
+    async def wait_for_login(self, auth_process) -> bool:
+        """
+        Wait up to 5 minutes for the login to finish, signalled by the login
+        process exiting or a credentials file appearing. Returns False on timeout.
+        """
+        waiters = {asyncio.ensure_future(auth_process.wait())}
+        if awatch is not None:
+            waiters.add(asyncio.ensure_future(self.wait_for_credentials()))
+        
+        try:
+            for elapsed in range(0, 300, 30):
+                logger.info("Still waiting for authentication... (%d/300 seconds)", elapsed)
+                done, _ = await asyncio.wait(waiters, timeout=30, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in done:
+                    if waiter.exception() is None:
+                        return True
+                    # A broken credentials watch still leaves the process exit to wait on
+                    logger.warning("Error watching for credentials: %s", waiter.exception())
+                    waiters.discard(waiter)
+            return False
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+    
+    async def save_auth_state(self):
         """Save authentication state to persistent storage."""
         logger.info("Saving authentication state...")
         
         # Copy claude config to persistent storage
-        claude_config_dir = Path.home() / ".config" / "claude"
-        if claude_config_dir.exists():
+        if self._claude_config_src.exists():
             try:
-                subprocess.run(
-                    ["cp", "-r", str(claude_config_dir), "/config/claude/.claude_auth"],
-                    check=True
+                # copy2 already copies file data in-kernel via sendfile on Linux and keeps file modes
+                await asyncio.to_thread(
+                    shutil.copytree,
+                    self._claude_config_src,
+                    self._claude_config_dst,
+                    dirs_exist_ok=True
                 )
                 logger.info("Authentication state saved")
             except Exception as e:
-                logger.error(f"Error saving auth state: {e}")
+                logger.error("Error saving auth state: %s", e)
+        
+        # Force the next check to re-run the CLI against the saved state
+        self._version_cache = None
+    
+    async def authenticate(self):
+        """Run the desktop wait and browser login flow."""
+        logger.info("Authentication needed")
+        
+        if await self.wait_for_desktop():
+            if await self.launch_browser_for_auth():
+                logger.info("Authentication completed successfully")
+            else:
+                logger.error("Authentication failed")
+        else:
+            logger.error("Desktop environment not available")
+    
+    def _is_marker(self, change, path: str) -> bool:
+        """Filter watch events down to the auth marker files."""
+        return os.path.basename(path) in self._marker_names
+    
+    async def watch_markers(self):
+        """React to auth marker changes via inotify instead of polling."""
+        self.config_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Yield an empty change set every 30 seconds as a fallback re-check
+        async for _ in awatch(
+            self.need_auth_file.parent,
+            self.config_dir,
+            watch_filter=self._is_marker,
+            recursive=False,
+            rust_timeout=30000,
+            yield_on_timeout=True
+        ):
+            try:
+                # check_auth_needed sees a new need_auth marker itself, after the
+                # AUTH_METHOD and .auth_verified gates
+                if await self.check_auth_needed():
+                    await self.authenticate()
+            except Exception as e:
+                logger.error("Error in auth handler: %s", e)
     
     async def run(self):
-        """Main run loop."""
+        """Main run loop. Returns cleanly on SIGTERM/SIGINT."""
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        
+        serve = asyncio.ensure_future(self.serve())
+        stopped = asyncio.ensure_future(stop.wait())
+        await asyncio.wait({serve, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        stopped.cancel()
+        
+        if serve.done():
+            serve.result()
+        else:
+            logger.info("Shutting down auth handler")
+            serve.cancel()
+            try:
+                await serve
+            except asyncio.CancelledError:
+                pass
+        
+        # Don't leave a login child behind for the container runtime to reap
+        if self._auth_process is not None and self._auth_process.returncode is None:
+            self._auth_process.terminate()
+            await self._auth_process.wait()
+    
+    async def serve(self):
+        """Watch for authentication needs until cancelled."""
         logger.info("Docker authentication handler started")
         
         # Initial wait for services to start
         await asyncio.sleep(5)
         
+        if awatch is not None:
+            # Markers created before the watch is armed are caught by this one-shot check
+            try:
+                if await self.check_auth_needed():
+                    await self.authenticate()
+            except Exception as e:
+                logger.error("Error in auth handler: %s", e)
+            
+            await self.watch_markers()
+            return
+        
+        # Without inotify, poll with exponential backoff: quick checks right after
+        # startup or an auth attempt, stretching to every 5 minutes when idle
+        delay = 1.0
         while True:
             try:
-                if self.check_auth_needed():
-                    logger.info("Authentication needed")
-                    
-                    if self.wait_for_desktop():
-                        if self.launch_browser_for_auth():
-                            logger.info("Authentication completed successfully")
-                        else:
-                            logger.error("Authentication failed")
-                    else:
-                        logger.error("Desktop environment not available")
+                if await self.check_auth_needed():
+                    await self.authenticate()
+                    delay = 1.0
+                else:
+                    delay = min(delay * 2, 300)
                 
-                # Check every 30 seconds
-                await asyncio.sleep(30)
+                await asyncio.sleep(delay)
                 
             except Exception as e:
-                logger.error(f"Error in auth handler: {e}")
+                logger.error("Error in auth handler: %s", e)
                 await asyncio.sleep(30)
 
+def use_pidfd_child_watcher():
+    """Reap children via pidfd instead of the per-child threads asyncio uses before 3.12."""
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        # pidfd_open needs Linux 5.3+, whatever Python was built with
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return
+    asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+
 def main():
     """Main entry point."""
+    use_pidfd_child_watcher()
     handler = DockerAuthHandler()
     asyncio.run(handler.run())
 
@@ -1,28 +1,36 @@
 import os
+import functools
+import hashlib
+import itertools
 import json
-import asyncio
 import logging
+import re
 import secrets
+import socket
 import string
-from typing import Optional, AsyncGenerator, Dict, Any
+import time
+import orjson
+import uvicorn
+import yaml
+from typing import Optional, AsyncGenerator, Dict, Any, List, Tuple
 from contextlib import asynccontextmanager
+from datetime import datetime
 
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse, FileResponse
+from fastapi.responses import Response, StreamingResponse, JSONResponse, ORJSONResponse, HTMLResponse
 from fastapi.exceptions import RequestValidationError
+from fastapi.openapi.utils import get_openapi
 from pydantic import ValidationError
 from dotenv import load_dotenv
 
 from models import (
     ChatCompletionRequest, 
     ChatCompletionResponse, 
-    ChatCompletionStreamResponse,
     Choice, 
     Message, 
     Usage,
-    StreamChoice,
     ErrorResponse,
     ErrorDetail,
     SessionInfo,
@@ -32,26 +40,29 @@ from models import (
 )
 from claude_cli import ClaudeCodeCLI
 from message_adapter import MessageAdapter
-from auth import verify_api_key, security, validate_claude_code_auth, get_claude_code_auth_info
+from auth import auth_manager, verify_api_key, security, validate_claude_code_auth, get_claude_code_auth_info
 from parameter_validator import ParameterValidator, CompatibilityReporter
 from session_manager import session_manager
 from tool_handler import tool_handler
 from tools import tool_registry
-from moxie_integration import format_moxie_response, MoxieResponseEnhancer
+from moxie_integration import EMOTION_TABLE, format_moxie_response, get_enhancer
 from user_recognition import MoxieSessionManager, UserType
 
 # Load environment variables
 load_dotenv()
 
+# Values accepted as "on" for boolean env flags and headers
+_TRUTHY = frozenset({'true', '1', 'yes', 'on'})
+
 # Configure logging based on debug mode
-DEBUG_MODE = os.getenv('DEBUG_MODE', 'false').lower() in ('true', '1', 'yes', 'on')
-VERBOSE = os.getenv('VERBOSE', 'false').lower() in ('true', '1', 'yes', 'on')
+DEBUG_MODE = os.getenv('DEBUG_MODE', 'false').lower() in _TRUTHY
+VERBOSE = os.getenv('VERBOSE', 'false').lower() in _TRUTHY
 
 # Moxie-specific configuration
-MOXIE_MODE = os.getenv('MOXIE_MODE', 'true').lower() in ('true', '1', 'yes', 'on')
-MOXIE_EMOTION_DETECTION = os.getenv('MOXIE_EMOTION_DETECTION', 'true').lower() in ('true', '1', 'yes', 'on')
-MOXIE_CHILD_MODE = os.getenv('MOXIE_CHILD_MODE', 'false').lower() in ('true', '1', 'yes', 'on')
-TTSFM_ENABLED = os.getenv('TTSFM_ENABLED', 'false').lower() in ('true', '1', 'yes', 'on')
+MOXIE_MODE = os.getenv('MOXIE_MODE', 'true').lower() in _TRUTHY
+MOXIE_EMOTION_DETECTION = os.getenv('MOXIE_EMOTION_DETECTION', 'true').lower() in _TRUTHY
+MOXIE_CHILD_MODE = os.getenv('MOXIE_CHILD_MODE', 'false').lower() in _TRUTHY
+TTSFM_ENABLED = os.getenv('TTSFM_ENABLED', 'false').lower() in _TRUTHY
 TTSFM_ENDPOINT = os.getenv('TTSFM_ENDPOINT', 'http://localhost:8001')
 
 # Set logging level based on debug/verbose mode
@@ -197,13 +208,14 @@ app = FastAPI(
     description="OpenAI-compatible API for Claude Code",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url=None,  # Disable default docs
     redoc_url=None,  # Disable default redoc
     openapi_url=None  # We'll provide our own
 )
 
 # Configure CORS
-cors_origins = json.loads(os.getenv("CORS_ORIGINS", '["*"]'))
+cors_origins = orjson.loads(os.getenv("CORS_ORIGINS", '["*"]'))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
@@ -212,15 +224,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add debug logging middleware
-@app.middleware("http")
+# Debug logging middleware
+DEBUG_BODY_LOG_LIMIT = 64 * 1024
+
 async def debug_logging_middleware(request: Request, call_next):
     """Log request/response details when debug mode is enabled."""
-    if not (DEBUG_MODE or VERBOSE):
-        return await call_next(request)
-    
     # Log request details
-    start_time = asyncio.get_event_loop().time()
+    start_time = time.perf_counter()
     
     # Log basic request info
     logger.debug(f"🔍 Incoming request: {request.method} {request.url}")
@@ -231,17 +241,18 @@ async def debug_logging_middleware(request: Request, call_next):
         try:
             body = await request.body()
             if body:
-                # Decode and parse JSON to log it nicely
-                try:
-                    import json as json_lib
-                    parsed_body = json_lib.loads(body.decode())
-                    logger.debug(f"🔍 Request body: {json_lib.dumps(parsed_body, indent=2)}")
-                except:
-                    logger.debug(f"🔍 Request body (raw): {body.decode()}")
+                # Pretty-print small bodies; large ones only get a size and digest
+                if len(body) > DEBUG_BODY_LOG_LIMIT:
+                    logger.debug("🔍 Request body: %d bytes, sha1 %s", len(body), hashlib.sha1(body).hexdigest()[:12])
+                else:
+                    try:
+                        logger.debug("🔍 Request body: %s", orjson.dumps(orjson.loads(body), option=orjson.OPT_INDENT_2).decode())
+                    except orjson.JSONDecodeError:
+                        logger.debug("🔍 Request body (raw): %s", body.decode(errors="replace"))
                 
                 # Recreate request with the body we consumed
                 async def receive():
-                    return {"type": "http.request", "body": body}
+                    return {"type": "http.request", "body": body, "more_body": False}
                 request._receive = receive
         except Exception as e:
             logger.debug(f"🔍 Could not read request body: {e}")
@@ -251,21 +262,24 @@ async def debug_logging_middleware(request: Request, call_next):
         response = await call_next(request)
         
         # Log response details
-        end_time = asyncio.get_event_loop().time()
-        duration = (end_time - start_time) * 1000  # Convert to milliseconds
+        duration = (time.perf_counter() - start_time) * 1000  # Convert to milliseconds
         
         logger.debug(f"🔍 Response: {response.status_code} in {duration:.2f}ms")
         
         return response
         
     except Exception as e:
-        end_time = asyncio.get_event_loop().time()
-        duration = (end_time - start_time) * 1000
+        duration = (time.perf_counter() - start_time) * 1000
         
         logger.debug(f"🔍 Request failed after {duration:.2f}ms: {e}")
         raise
 
 
+# Only register it in debug mode so production requests skip the extra layer
+if DEBUG_MODE or VERBOSE:
+    app.middleware("http")(debug_logging_middleware)
+
+
 # Custom exception handler for 422 validation errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -318,57 +332,134 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     if debug_info:
         error_response["error"]["debug"] = debug_info
     
+    # Stdlib JSON on purpose: "input" echoes client values such as ints wider
+    # than 64 bits, which orjson refuses to serialize
     return JSONResponse(
         status_code=422,
         content=error_response
     )
 
 
+# Completion ids only need to be unique, not secret: a random per-process
+# prefix keeps workers apart and a counter avoids a getrandom call per request
+_REQUEST_ID_PREFIX = f"chatcmpl-{os.urandom(4).hex()}"
+_request_counter = itertools.count()
+
+# Every Claude Code tool, disallowed when a request does not enable tools
+_DEFAULT_DISALLOWED_TOOLS = ('Task', 'Bash', 'Glob', 'Grep', 'LS', 'exit_plan_mode',
+                             'Read', 'Edit', 'MultiEdit', 'Write', 'NotebookRead',
+                             'NotebookEdit', 'WebFetch', 'TodoRead', 'TodoWrite', 'WebSearch')
+
+# Pre-serialized pieces of the chat.completion.chunk SSE frame
+_CONTENT_FRAME_INFIX = b',"choices":[{"index":0,"delta":{"content":'
+_CONTENT_FRAME_SUFFIX = b'},"finish_reason":null}],"system_fingerprint":null}\n\n'
+_FINAL_FRAME_SUFFIX = b',"choices":[{"index":0,"delta":{},"finish_reason":"stop"}],"system_fingerprint":null}\n\n'
+
+
+def _stream_frame_head(request_id: str, model: str) -> bytes:
+    """Build the ``data: {"id":...,"model":...`` prefix shared by every chunk of a stream."""
+    envelope = {
+        "id": request_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+    }
+    return b"data: " + orjson.dumps(envelope)[:-1]
+
+
+def _extract_text_blocks(chunk: Any) -> List[str]:
+    """Return the non-empty text pieces carried by a streamed SDK chunk."""
+    if not isinstance(chunk, dict):
+        return []
+    
+    content = chunk.get("content")
+    if isinstance(content, list):
+        # New SDK format: content blocks sit directly on the chunk, as dicts or TextBlock objects
+        texts = []
+        for block in content:
+            if isinstance(block, dict):
+                text = block.get("text") if block.get("type") == "text" else None
+            else:
+                text = getattr(block, "text", None)
+            if text:
+                texts.append(text)
+        return texts
+    
+    # Old format: assistant message wrapping the content
+    if chunk.get("type") == "assistant":
+        message = chunk.get("message")
+        if isinstance(message, dict):
+            content = message.get("content")
+            if isinstance(content, list):
+                return [block["text"] for block in content
+                        if isinstance(block, dict) and block.get("type") == "text" and block.get("text")]
+            if isinstance(content, str) and content:
+                return [content]
+    return []
+
+
+def _prepare_claude_request(
+    request: ChatCompletionRequest,
+    claude_headers: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Message], Optional[str], str, Optional[str], Dict[str, Any]]:
+    """
+    Shared preprocessing for streaming and non-streaming completions.
+    Returns (all_messages, session_id, prompt, system_prompt, claude_options)
+    """
+    # Process messages with session management
+    all_messages, actual_session_id = session_manager.process_messages(
+        request.messages, request.session_id
+    )
+    
+    # Convert messages to prompt
+    prompt, system_prompt = MessageAdapter.messages_to_prompt(all_messages)
+    
+    # Filter content for unsupported features
+    prompt = MessageAdapter.filter_content(prompt)
+    if system_prompt:
+        system_prompt = MessageAdapter.filter_content(system_prompt)
+    
+    # Get Claude Code SDK options from request
+    claude_options = request.to_claude_options()
+    
+    # Merge with Claude-specific headers if provided
+    if claude_headers:
+        claude_options.update(claude_headers)
+    
+    # Validate model
+    if claude_options.get('model'):
+        ParameterValidator.validate_model(claude_options['model'])
+    
+    return all_messages, actual_session_id, prompt, system_prompt, claude_options
+
+
 async def generate_streaming_response(
     request: ChatCompletionRequest,
     request_id: str,
     claude_headers: Optional[Dict[str, Any]] = None
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """Generate SSE formatted streaming response."""
     try:
-        # Process messages with session management
-        all_messages, actual_session_id = session_manager.process_messages(
-            request.messages, request.session_id
+        all_messages, actual_session_id, prompt, system_prompt, claude_options = _prepare_claude_request(
+            request, claude_headers
         )
         
-        # Convert messages to prompt
-        prompt, system_prompt = MessageAdapter.messages_to_prompt(all_messages)
-        
-        # Filter content for unsupported features
-        prompt = MessageAdapter.filter_content(prompt)
-        if system_prompt:
-            system_prompt = MessageAdapter.filter_content(system_prompt)
-        
-        # Get Claude Code SDK options from request
-        claude_options = request.to_claude_options()
-        
-        # Merge with Claude-specific headers if provided
-        if claude_headers:
-            claude_options.update(claude_headers)
-        
-        # Validate model
-        if claude_options.get('model'):
-            ParameterValidator.validate_model(claude_options['model'])
-        
         # Handle tools - disabled by default for OpenAI compatibility
         if not request.enable_tools:
             # Set disallowed_tools to all available tools to disable them
-            disallowed_tools = ['Task', 'Bash', 'Glob', 'Grep', 'LS', 'exit_plan_mode', 
-                                'Read', 'Edit', 'MultiEdit', 'Write', 'NotebookRead', 
-                                'NotebookEdit', 'WebFetch', 'TodoRead', 'TodoWrite', 'WebSearch']
-            claude_options['disallowed_tools'] = disallowed_tools
+            claude_options['disallowed_tools'] = _DEFAULT_DISALLOWED_TOOLS
             claude_options['max_turns'] = 1  # Single turn for Q&A
             logger.info("Tools disabled (default behavior for OpenAI compatibility)")
         else:
             logger.info("Tools enabled by user request")
         
-        # Run Claude Code
-        chunks_buffer = []
+        # The chunk envelope is fixed for the whole stream, so serialize it once
+        frame_head = _stream_frame_head(request_id, request.model)
+        frame_prefix = frame_head + _CONTENT_FRAME_INFIX
+        
+        # Run Claude Code; chunks are only kept when a session needs the reply stored
+        chunks_buffer = [] if actual_session_id else None
+        debug_chunks = logger.isEnabledFor(logging.DEBUG)
         async for chunk in claude_cli.run_completion(
             prompt=prompt,
             system_prompt=system_prompt,
@@ -378,85 +469,20 @@ async def generate_streaming_response(
             disallowed_tools=claude_options.get('disallowed_tools'),
             stream=True
         ):
-            chunks_buffer.append(chunk)
+            if chunks_buffer is not None:
+                chunks_buffer.append(chunk)
             
             # Debug logging for chunk structure
-            if logger.isEnabledFor(logging.DEBUG):
-                logger.debug(f"Streaming chunk type: {type(chunk)}")
-                logger.debug(f"Streaming chunk keys: {chunk.keys() if isinstance(chunk, dict) else 'Not a dict'}")
+            if debug_chunks:
+                logger.debug("Streaming chunk type: %s", type(chunk))
                 if isinstance(chunk, dict):
-                    logger.debug(f"Chunk content type: {type(chunk.get('content')) if 'content' in chunk else 'No content'}")
+                    logger.debug("Streaming chunk keys: %s", chunk.keys())
+                    logger.debug("Chunk content type: %s", type(chunk["content"]) if "content" in chunk else "No content")
+                else:
+                    logger.debug("Streaming chunk keys: Not a dict")
             
-            # NEW: Check for direct content (new SDK format)
-            if isinstance(chunk, dict) and "content" in chunk and isinstance(chunk["content"], list):
-                # This is the new SDK format where content is directly in the chunk
-                for block in chunk["content"]:
-                    if isinstance(block, dict) and block.get("type") == "text":
-                        text = block.get("text", "")
-                        if text:  # Only send if there's actual text
-                            stream_chunk = ChatCompletionStreamResponse(
-                                id=request_id,
-                                model=request.model,
-                                choices=[StreamChoice(
-                                    index=0,
-                                    delta={"content": text},
-                                    finish_reason=None
-                                )]
-                            )
-                            yield f"data: {stream_chunk.model_dump_json()}\n\n"
-                    # Handle TextBlock objects
-                    elif hasattr(block, 'text'):
-                        text = block.text
-                        if text:
-                            stream_chunk = ChatCompletionStreamResponse(
-                                id=request_id,
-                                model=request.model,
-                                choices=[StreamChoice(
-                                    index=0,
-                                    delta={"content": text},
-                                    finish_reason=None
-                                )]
-                            )
-                            yield f"data: {stream_chunk.model_dump_json()}\n\n"
-            
-            # EXISTING: Check for old format (assistant message)
-            elif chunk.get("type") == "assistant" and "message" in chunk:
-                message = chunk["message"]
-                if isinstance(message, dict) and "content" in message:
-                    content = message["content"]
-                    
-                    # Handle content blocks
-                    if isinstance(content, list):
-                        for block in content:
-                            if isinstance(block, dict) and block.get("type") == "text":
-                                text = block.get("text", "")
-                                if text:  # Only send if there's actual text
-                                    # Create streaming chunk
-                                    stream_chunk = ChatCompletionStreamResponse(
-                                        id=request_id,
-                                        model=request.model,
-                                        choices=[StreamChoice(
-                                            index=0,
-                                            delta={"content": text},
-                                            finish_reason=None
-                                        )]
-                                    )
-                                    
-                                    yield f"data: {stream_chunk.model_dump_json()}\n\n"
-                    
-                    elif isinstance(content, str) and content:
-                        # Create streaming chunk
-                        stream_chunk = ChatCompletionStreamResponse(
-                            id=request_id,
-                            model=request.model,
-                            choices=[StreamChoice(
-                                index=0,
-                                delta={"content": content},
-                                finish_reason=None
-                            )]
-                        )
-                        
-                        yield f"data: {stream_chunk.model_dump_json()}\n\n"
+            for text in _extract_text_blocks(chunk):
+                yield frame_prefix + orjson.dumps(text) + _CONTENT_FRAME_SUFFIX
         
         # Extract assistant response from all chunks for session storage
         if actual_session_id and chunks_buffer:
@@ -466,17 +492,8 @@ async def generate_streaming_response(
                 session_manager.add_assistant_response(actual_session_id, assistant_message)
         
         # Send final chunk with finish reason
-        final_chunk = ChatCompletionStreamResponse(
-            id=request_id,
-            model=request.model,
-            choices=[StreamChoice(
-                index=0,
-                delta={},
-                finish_reason="stop"
-            )]
-        )
-        yield f"data: {final_chunk.model_dump_json()}\n\n"
-        yield "data: [DONE]\n\n"
+        yield frame_head + _FINAL_FRAME_SUFFIX
+        yield b"data: [DONE]\n\n"
         
     except Exception as e:
         logger.error(f"Streaming error: {e}")
@@ -486,7 +503,7 @@ async def generate_streaming_response(
                 "type": "streaming_error"
             }
         }
-        yield f"data: {json.dumps(error_chunk)}\n\n"
+        yield b"data: " + orjson.dumps(error_chunk) + b"\n\n"
 
 
 @app.post("/v1/chat/completions")
@@ -515,7 +532,7 @@ async def chat_completions(
         )
     
     try:
-        request_id = f"chatcmpl-{os.urandom(8).hex()}"
+        request_id = f"{_REQUEST_ID_PREFIX}{next(_request_counter):x}"
         
         # Extract Claude-specific parameters from headers
         claude_headers = ParameterValidator.extract_claude_headers(dict(request.headers))
@@ -533,42 +550,26 @@ async def chat_completions(
                 headers={
                     "Cache-Control": "no-cache",
                     "Connection": "keep-alive",
+                    # Stop nginx-style proxies from buffering or compressing the token stream
+                    "X-Accel-Buffering": "no",
+                    "Content-Encoding": "identity",
                 }
             )
         else:
             # Non-streaming response
-            # Process messages with session management
-            all_messages, actual_session_id = session_manager.process_messages(
-                request_body.messages, request_body.session_id
+            all_messages, actual_session_id, prompt, system_prompt, claude_options = _prepare_claude_request(
+                request_body, claude_headers
             )
             
             logger.info(f"Chat completion: session_id={actual_session_id}, total_messages={len(all_messages)}")
             
-            # Convert messages to prompt
-            prompt, system_prompt = MessageAdapter.messages_to_prompt(all_messages)
-            
-            # Filter content
-            prompt = MessageAdapter.filter_content(prompt)
-            if system_prompt:
-                system_prompt = MessageAdapter.filter_content(system_prompt)
-            
-            # Get Claude Code SDK options from request
-            claude_options = request_body.to_claude_options()
-            
-            # Merge with Claude-specific headers
-            if claude_headers:
-                claude_options.update(claude_headers)
-            
-            # Validate model
-            if claude_options.get('model'):
-                ParameterValidator.validate_model(claude_options['model'])
-            
             # Handle tools based on request
-            tools_enabled = tool_handler.should_enable_tools(request_body.model_dump())
+            request_dump = request_body.model_dump()
+            tools_enabled = tool_handler.should_enable_tools(request_dump)
             
             if tools_enabled:
                 # Get tool configuration
-                allowed_tools, disallowed_tools = tool_handler.get_tool_config(request_body.model_dump())
+                allowed_tools, disallowed_tools = tool_handler.get_tool_config(request_dump)
                 
                 if allowed_tools is not None:
                     claude_options['allowed_tools'] = allowed_tools
@@ -582,10 +583,7 @@ async def chat_completions(
                 logger.info(f"Tools enabled with config: allowed={allowed_tools}, disallowed={disallowed_tools}")
             else:
                 # Disable all tools for OpenAI compatibility
-                disallowed_tools = ['Task', 'Bash', 'Glob', 'Grep', 'LS', 'exit_plan_mode', 
-                                    'Read', 'Edit', 'MultiEdit', 'Write', 'NotebookRead', 
-                                    'NotebookEdit', 'WebFetch', 'TodoRead', 'TodoWrite', 'WebSearch']
-                claude_options['disallowed_tools'] = disallowed_tools
+                claude_options['disallowed_tools'] = _DEFAULT_DISALLOWED_TOOLS
                 claude_options['max_turns'] = 1  # Single turn for Q&A
                 logger.info("Tools disabled (default behavior for OpenAI compatibility)")
             
@@ -611,7 +609,7 @@ async def chat_completions(
             # Apply Moxie enhancements if enabled
             if MOXIE_MODE:
                 # Check if child mode is requested via header or use global setting
-                child_mode = request.headers.get('X-Moxie-Child-Mode', '').lower() in ('true', '1', 'yes') or MOXIE_CHILD_MODE
+                child_mode = request.headers.get('X-Moxie-Child-Mode', '').lower() in _TRUTHY or MOXIE_CHILD_MODE
                 moxie_response = format_moxie_response(assistant_content, enable_ttsfm=TTSFM_ENABLED, child_mode=child_mode)
                 
                 # Use the filtered/enhanced text
@@ -680,6 +678,15 @@ async def chat_completions(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@functools.lru_cache(maxsize=1)
+def _tools_response(enabled_tools: frozenset) -> bytes:
+    """Serialized /v1/tools body, rebuilt only when the enabled tool set changes."""
+    return orjson.dumps({
+        "object": "list",
+        "data": tool_registry.format_for_openai()
+    })
+
+
 @app.get("/v1/tools")
 async def list_tools(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
@@ -687,59 +694,75 @@ async def list_tools(
     """List available tools/functions."""
     await verify_api_key(None, credentials)
     
-    return {
-        "object": "list",
-        "data": tool_registry.format_for_openai()
-    }
+    return Response(
+        content=_tools_response(frozenset(tool_registry.enabled_tools)),
+        media_type="application/json"
+    )
+
+
+# The model list is static, so serialize it once at import
+_MODELS_RESPONSE = orjson.dumps({
+    "object": "list",
+    "data": [
+        {"id": "claude-sonnet-4-20250514", "object": "model", "owned_by": "anthropic"},
+        {"id": "claude-opus-4-20250514", "object": "model", "owned_by": "anthropic"},
+        {"id": "claude-3-7-sonnet-20250219", "object": "model", "owned_by": "anthropic"},
+        {"id": "claude-3-5-sonnet-20241022", "object": "model", "owned_by": "anthropic"},
+        {"id": "claude-3-5-haiku-20241022", "object": "model", "owned_by": "anthropic"},
+    ]
+})
 
 
 @app.get("/v1/models")
 async def list_models():
     """List available models."""
-    return {
-        "object": "list",
-        "data": [
-            {"id": "claude-sonnet-4-20250514", "object": "model", "owned_by": "anthropic"},
-            {"id": "claude-opus-4-20250514", "object": "model", "owned_by": "anthropic"},
-            {"id": "claude-3-7-sonnet-20250219", "object": "model", "owned_by": "anthropic"},
-            {"id": "claude-3-5-sonnet-20241022", "object": "model", "owned_by": "anthropic"},
-            {"id": "claude-3-5-haiku-20241022", "object": "model", "owned_by": "anthropic"},
-        ]
-    }
+    return Response(content=_MODELS_RESPONSE, media_type="application/json")
+
+
+# Static half of the /v1/compatibility response
+_CLAUDE_SDK_OPTIONS = {
+    "supported": [
+        "model", "system_prompt", "max_turns", "allowed_tools", 
+        "disallowed_tools", "permission_mode", "max_thinking_tokens",
+        "continue_conversation", "resume", "cwd"
+    ],
+    "custom_headers": [
+        "X-Claude-Max-Turns", "X-Claude-Allowed-Tools", 
+        "X-Claude-Disallowed-Tools", "X-Claude-Permission-Mode",
+        "X-Claude-Max-Thinking-Tokens"
+    ]
+}
 
 
 @app.post("/v1/compatibility")
 async def check_compatibility(request_body: ChatCompletionRequest):
     """Check OpenAI API compatibility for a request."""
     report = CompatibilityReporter.generate_compatibility_report(request_body)
-    return {
+    return ORJSONResponse(content={
         "compatibility_report": report,
-        "claude_code_sdk_options": {
-            "supported": [
-                "model", "system_prompt", "max_turns", "allowed_tools", 
-                "disallowed_tools", "permission_mode", "max_thinking_tokens",
-                "continue_conversation", "resume", "cwd"
-            ],
-            "custom_headers": [
-                "X-Claude-Max-Turns", "X-Claude-Allowed-Tools", 
-                "X-Claude-Disallowed-Tools", "X-Claude-Permission-Mode",
-                "X-Claude-Max-Thinking-Tokens"
-            ]
-        }
-    }
+        "claude_code_sdk_options": _CLAUDE_SDK_OPTIONS
+    })
+
+
+# The health payload only reflects import-time config flags
+_HEALTH_RESPONSE = orjson.dumps({
+    "status": "healthy", 
+    "service": "moxie-claude-wrapper",
+    "moxie_mode": MOXIE_MODE,
+    "emotion_detection": MOXIE_EMOTION_DETECTION,
+    "child_mode": MOXIE_CHILD_MODE,
+    "ttsfm_enabled": TTSFM_ENABLED
+})
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {
-        "status": "healthy", 
-        "service": "moxie-claude-wrapper",
-        "moxie_mode": MOXIE_MODE,
-        "emotion_detection": MOXIE_EMOTION_DETECTION,
-        "child_mode": MOXIE_CHILD_MODE,
-        "ttsfm_enabled": TTSFM_ENABLED
-    }
+    return Response(content=_HEALTH_RESPONSE, media_type="application/json", headers={"Cache-Control": "no-cache"})
+
+
+# HEAD for probes; the server sends only the headers, Content-Length included
+app.head("/health", include_in_schema=False)(health_check)
 
 
 @app.post("/v1/moxie/analyze")
@@ -758,7 +781,7 @@ async def analyze_for_moxie(
     child_mode = request.get("child_mode", MOXIE_CHILD_MODE)
     
     # Use Moxie response enhancer
-    enhancer = MoxieResponseEnhancer(child_mode=child_mode)
+    enhancer = get_enhancer(child_mode)
     result = enhancer.enhance_response(text, include_emotion=TTSFM_ENABLED)
     
     return {
@@ -771,37 +794,13 @@ async def analyze_for_moxie(
     }
 
 
+_EMOTIONS_RESPONSE = orjson.dumps({"emotions": EMOTION_TABLE})
+
+
 @app.get("/v1/moxie/emotions")
 async def list_emotions():
     """List available Moxie emotions and their mappings."""
-    return {
-        "emotions": {
-            "happy": {
-                "animation": "cmd:animate:joy",
-                "ttsfm_instruction": "Speak with joy and enthusiasm, upbeat and cheerful"
-            },
-            "sad": {
-                "animation": "cmd:animate:sympathetic", 
-                "ttsfm_instruction": "Speak with a gentle, sympathetic tone, slightly slower"
-            },
-            "curious": {
-                "animation": "cmd:animate:thinking",
-                "ttsfm_instruction": "Speak with wonder and interest, rising intonation on questions"
-            },
-            "excited": {
-                "animation": "cmd:animate:celebrate",
-                "ttsfm_instruction": "Speak with high energy and excitement, faster pace"
-            },
-            "caring": {
-                "animation": "cmd:animate:hug",
-                "ttsfm_instruction": "Speak with warmth and compassion, gentle and reassuring"
-            },
-            "neutral": {
-                "animation": "cmd:animate:friendly",
-                "ttsfm_instruction": "Speak in a friendly, conversational tone"
-            }
-        }
-    }
+    return Response(content=_EMOTIONS_RESPONSE, media_type="application/json")
 
 
 @app.post("/v1/moxie/identify")
@@ -830,8 +829,8 @@ async def list_users(
         users.append({
             "user_id": user_id,
             "name": profile.name,
-            "type": profile.user_type.value,
-            "last_seen": profile.last_seen.isoformat()
+            "type": profile.type_value,
+            "last_seen": datetime.fromtimestamp(profile.last_seen).isoformat()
         })
     
     return {"users": users}
@@ -851,55 +850,152 @@ async def create_user(
     if not name:
         raise HTTPException(status_code=400, detail="Name is required")
     
+    user_recognition = moxie_session_manager.user_recognition
+    profile_fields = {
+        "name": name,
+        "user_type": UserType(user_type),
+        "voice_profile": request.get("voice_profile"),
+        "face_id": request.get("face_id")
+    }
+    
+    # Opt-in: return the matching profile rather than creating a duplicate
+    if request.get("reuse_existing"):
+        existing = user_recognition.find_duplicate(**profile_fields)
+        if existing is not None:
+            return {
+                "user_id": existing.user_id,
+                "name": existing.name,
+                "type": existing.type_value,
+                "created": False,
+                "message": f"User profile already exists for {name}"
+            }
+    
     # Create profile
-    profile = moxie_session_manager.user_recognition.create_profile(
-        name=name,
-        user_type=UserType(user_type),
-        voice_profile=request.get("voice_profile"),
-        face_id=request.get("face_id")
-    )
+    profile = user_recognition.create_profile(**profile_fields)
     
     return {
         "user_id": profile.user_id,
         "name": profile.name,
-        "type": profile.user_type.value,
+        "type": profile.type_value,
+        "created": True,
         "message": f"User profile created for {name}"
     }
 
 
+@functools.lru_cache(maxsize=1)
+def _swagger_html() -> bytes:
+    """Read the Swagger UI page once, preferring the standalone version."""
+    try:
+        with open("swagger-ui-standalone.html", "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        # Fall back to simple version
+        with open("swagger-ui.html", "rb") as f:
+            return f.read()
+
+
+@functools.lru_cache(maxsize=1)
+def _openapi_yaml() -> bytes:
+    """Read openapi.yaml once."""
+    with open("openapi.yaml", "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=1)
+def _openapi_yaml_digest() -> str:
+    """Content hash of openapi.yaml, used for its ETag and the JSON sidecar name."""
+    return hashlib.md5(_openapi_yaml(), usedforsecurity=False).hexdigest()
+
+
 @app.get("/docs", response_class=HTMLResponse)
 async def swagger_ui():
     """Serve Swagger UI for API documentation."""
     try:
-        # Try standalone version first
-        with open("swagger-ui-standalone.html", "r") as f:
-            return HTMLResponse(content=f.read())
+        return HTMLResponse(content=_swagger_html())
     except FileNotFoundError:
-        try:
-            # Fall back to simple version
-            with open("swagger-ui.html", "r") as f:
-                return HTMLResponse(content=f.read())
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail="Swagger UI not found")
+        raise HTTPException(status_code=404, detail="Swagger UI not found")
 
 
-@app.get("/openapi.yaml", response_class=FileResponse)
-async def openapi_spec_yaml():
+@app.get("/openapi.yaml", response_class=Response)
+async def openapi_spec_yaml(request: Request):
     """Serve OpenAPI specification in YAML format."""
     try:
-        return FileResponse("openapi.yaml", media_type="application/x-yaml")
+        content = _openapi_yaml()
+        etag = f'"{_openapi_yaml_digest()}"'
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="OpenAPI specification not found")
+    
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/x-yaml", headers=headers)
+
+
+# Per-user cache directory owned by the app; only its sidecars are ever removed
+_OPENAPI_CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "claude-code-openai-wrapper"
+)
+_OPENAPI_SIDECAR_NAME = re.compile(r"openapi\.[0-9a-f]{32}\.json")
+
+
+@functools.lru_cache(maxsize=1)
+def _openapi_json() -> bytes:
+    """
+    Parse openapi.yaml once and keep the JSON encoding of it.
+    The JSON is also written to an openapi.<md5>.json sidecar in the cache
+    directory so later boots with an unchanged spec skip YAML parsing entirely.
+    """
+    spec = _openapi_yaml()
+    sidecar = os.path.join(_OPENAPI_CACHE_DIR, f"openapi.{_openapi_yaml_digest()}.json")
+    try:
+        with open(sidecar, "rb") as f:
+            cached = f.read()
+        orjson.loads(cached)  # a far cheaper check than re-parsing the YAML
+        return cached
+    except FileNotFoundError:
+        pass
+    except orjson.JSONDecodeError:
+        logger.warning("Ignoring corrupt OpenAPI JSON cache %s", sidecar)
+    
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml when available
+    openapi_json = orjson.dumps(yaml.load(spec, Loader=loader))
+    _write_openapi_sidecar(sidecar, openapi_json)
+    return openapi_json
+
+
+def _write_openapi_sidecar(sidecar: str, openapi_json: bytes):
+    """Atomically replace the sidecar and remove ones left by older specs."""
+    # Per-process temp name so concurrent workers never see a partial file
+    tmp = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(_OPENAPI_CACHE_DIR, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(openapi_json)
+        os.replace(tmp, sidecar)
+    except OSError as e:
+        logger.debug("Could not write OpenAPI JSON cache %s: %s", sidecar, e)
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return
+    
+    current = os.path.basename(sidecar)
+    for name in os.listdir(_OPENAPI_CACHE_DIR):
+        if name != current and _OPENAPI_SIDECAR_NAME.fullmatch(name):
+            try:
+                os.unlink(os.path.join(_OPENAPI_CACHE_DIR, name))
+            except OSError:
+                pass
 
 
 @app.get("/openapi.json")
 async def openapi_spec_json():
     """Serve OpenAPI specification in JSON format."""
-    import yaml
     try:
-        with open("openapi.yaml", "r") as f:
-            openapi_dict = yaml.safe_load(f)
-        return JSONResponse(content=openapi_dict)
+        return Response(content=_openapi_json(), media_type="application/json")
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="OpenAPI specification not found")
     except Exception as e:
@@ -907,17 +1003,21 @@ async def openapi_spec_json():
         raise HTTPException(status_code=500, detail="Error processing OpenAPI specification")
 
 
-@app.get("/openapi-fastapi.json")
-async def openapi_fastapi():
-    """Get FastAPI's auto-generated OpenAPI schema."""
-    from fastapi.openapi.utils import get_openapi
-    
-    return get_openapi(
+@functools.lru_cache(maxsize=1)
+def _fastapi_schema() -> bytes:
+    """Build FastAPI's OpenAPI schema once; the route table is fixed after import."""
+    return orjson.dumps(get_openapi(
         title="Claude Code OpenAI API Wrapper",
         version="1.0.0",
         description="OpenAI-compatible API wrapper for Claude Code with session management and tool support",
         routes=app.routes,
-    )
+    ))
+
+
+@app.get("/openapi-fastapi.json")
+async def openapi_fastapi():
+    """Get FastAPI's auto-generated OpenAPI schema."""
+    return Response(content=_fastapi_schema(), media_type="application/json")
 
 
 @app.post("/v1/debug/request")
@@ -928,36 +1028,40 @@ async def debug_request_validation(request: Request):
         body = await request.body()
         raw_body = body.decode() if body else ""
         
-        # Try to parse as JSON
         parsed_body = None
         json_error = None
-        try:
-            import json as json_lib
-            parsed_body = json_lib.loads(raw_body) if raw_body else {}
-        except Exception as e:
-            json_error = str(e)
-        
-        # Try to validate against our model
         validation_result = {"valid": False, "errors": []}
-        if parsed_body:
+        if not body:
+            parsed_body = {}
+        else:
             try:
-                chat_request = ChatCompletionRequest(**parsed_body)
-                validation_result = {"valid": True, "validated_data": chat_request.model_dump()}
+                # Parse and validate in one pass in pydantic-core
+                chat_request = ChatCompletionRequest.model_validate_json(body)
+                parsed_body = chat_request.model_dump()
+                validation_result = {"valid": True, "validated_data": parsed_body}
             except ValidationError as e:
-                validation_result = {
-                    "valid": False,
-                    "errors": [
-                        {
-                            "field": " -> ".join(str(loc) for loc in error.get("loc", [])),
-                            "message": error.get("msg", "Unknown error"),
-                            "type": error.get("type", "validation_error"),
-                            "input": error.get("input")
-                        }
-                        for error in e.errors()
-                    ]
-                }
+                # Only a failed request gets a separate parse, to show what was sent.
+                # Stdlib json: unlike orjson it accepts ints of any size
+                try:
+                    parsed_body = json.loads(body)
+                except ValueError as parse_error:
+                    json_error = str(parse_error)
+                if parsed_body:
+                    validation_result = {
+                        "valid": False,
+                        "errors": [
+                            {
+                                "field": " -> ".join(str(loc) for loc in error.get("loc", [])),
+                                "message": error.get("msg", "Unknown error"),
+                                "type": error.get("type", "validation_error"),
+                                "input": error.get("input")
+                            }
+                            for error in e.errors()
+                        ]
+                    }
         
-        return {
+        # Stdlib JSON so big ints echoed from the body still serialize
+        return JSONResponse(content={
             "debug_info": {
                 "headers": dict(request.headers),
                 "method": request.method,
@@ -975,7 +1079,7 @@ async def debug_request_validation(request: Request):
                     "stream": False
                 }
             }
-        }
+        })
         
     except Exception as e:
         return {
@@ -991,8 +1095,6 @@ async def debug_request_validation(request: Request):
 @app.get("/v1/auth/status")
 async def get_auth_status():
     """Get Claude Code authentication status."""
-    from auth import auth_manager
-    
     auth_info = get_claude_code_auth_info()
     active_api_key = auth_manager.get_api_key()
     
@@ -1070,29 +1172,24 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 
 def find_available_port(start_port: int = 8000, max_attempts: int = 10) -> int:
-    """Find an available port starting from start_port."""
-    import socket
-    
+    """
+    Find an available port starting from start_port.
+    Each candidate is bound the same way uvicorn will bind it.
+    """
     for port in range(start_port, start_port + max_attempts):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)
-        try:
-            result = sock.connect_ex(('127.0.0.1', port))
-            if result != 0:  # Port is available
-                return port
-        except Exception:
-            return port
-        finally:
-            sock.close()
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(("0.0.0.0", port))
+            except OSError:
+                continue
+            return sock.getsockname()[1]
     
     raise RuntimeError(f"No available ports found in range {start_port}-{start_port + max_attempts - 1}")
 
 
 def run_server(port: int = None):
     """Run the server - used as Poetry script entry point."""
-    import uvicorn
-    import socket
-    
     # Handle interactive API key protection
     global runtime_api_key
     runtime_api_key = prompt_for_api_protection()
@@ -1102,9 +1199,23 @@ def run_server(port: int = None):
         port = int(os.getenv("PORT", "8000"))
     preferred_port = port
     
+    # Workers re-import main, so they need the import string and can only see
+    # the runtime API key through the environment they inherit
+    workers = int(os.getenv("UVICORN_WORKERS", "1"))
+    target = "main:app" if workers > 1 else app
+    if workers > 1 and runtime_api_key and not os.getenv("API_KEY"):
+        os.environ["API_KEY"] = runtime_api_key
+    server_options = {
+        "host": "0.0.0.0",
+        "loop": os.getenv("UVICORN_LOOP", "auto"),
+        "http": os.getenv("UVICORN_HTTP", "auto"),
+        "workers": workers,
+        "access_log": os.getenv("UVICORN_ACCESS_LOG", "true").lower() in _TRUTHY,
+    }
+    
     try:
         # Try the preferred port first
-        uvicorn.run(app, host="0.0.0.0", port=preferred_port)
+        uvicorn.run(target, port=preferred_port, **server_options)
     except OSError as e:
         if "Address already in use" in str(e) or e.errno == 48:
             logger.warning(f"Port {preferred_port} is already in use. Finding alternative port...")
@@ -1113,7 +1224,7 @@ def run_server(port: int = None):
                 logger.info(f"Starting server on alternative port {available_port}")
                 print(f"\n🚀 Server starting on http://localhost:{available_port}")
                 print(f"📝 Update your client base_url to: http://localhost:{available_port}/v1")
-                uvicorn.run(app, host="0.0.0.0", port=available_port)
+                uvicorn.run(target, port=available_port, **server_options)
             except RuntimeError as port_error:
                 logger.error(f"Could not find available port: {port_error}")
                 print(f"\n❌ Error: {port_error}")
@@ -3,6 +3,11 @@ from models import Message
 import re
 
 
+# Pattern to match image references or base64 data
+_IMAGE_PATTERN = re.compile(r'\[Image:.*?\]|data:image/.*?;base64,.*?(?=\s|$)')
+_IMAGE_PLACEHOLDER = "[Image: Content not supported by Claude Code]"
+
+
 class MessageAdapter:
     """Converts between OpenAI message format and Claude Code prompts."""
     
@@ -39,14 +44,7 @@ class MessageAdapter:
         Filter content for unsupported features (like images).
         Replace image references with text placeholders.
         """
-        # Pattern to match image references or base64 data
-        image_pattern = r'\[Image:.*?\]|data:image/.*?;base64,.*?(?=\s|$)'
-        
-        def replace_image(match):
-            return "[Image: Content not supported by Claude Code]"
-        
-        filtered = re.sub(image_pattern, replace_image, content)
-        return filtered
+        return _IMAGE_PATTERN.sub(_IMAGE_PLACEHOLDER, content)
     
     @staticmethod
     def format_claude_response(content: str, model: str, finish_reason: str = "stop") -> Dict[str, Any]:
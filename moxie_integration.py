@@ -3,11 +3,54 @@ Moxie-specific integration features for Claude wrapper
 """
 
 import re
+import functools
 import logging
 from typing import Dict, Optional, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Simple replacements for more child-friendly language
+_FRIENDLY_REPLACEMENTS = {
+    "I don't know": "That's a great question! Let me think about that",
+    "I can't": "Let's see what we can do instead",
+    "No": "Hmm, how about we try something else",
+    "That's wrong": "Let's try a different way",
+    "You're incorrect": "That's a good try! Here's another way to think about it"
+}
+_FRIENDLY_PREFIXES = tuple(_FRIENDLY_REPLACEMENTS)
+
+# Single source for every emotion's Moxie animation and TTSFM speaking style
+EMOTION_TABLE = {
+    "happy": {
+        "animation": "cmd:animate:joy",
+        "ttsfm_instruction": "Speak with joy and enthusiasm, upbeat and cheerful"
+    },
+    "sad": {
+        "animation": "cmd:animate:sympathetic",
+        "ttsfm_instruction": "Speak with a gentle, sympathetic tone, slightly slower"
+    },
+    "curious": {
+        "animation": "cmd:animate:thinking",
+        "ttsfm_instruction": "Speak with wonder and interest, rising intonation on questions"
+    },
+    "excited": {
+        "animation": "cmd:animate:celebrate",
+        "ttsfm_instruction": "Speak with high energy and excitement, faster pace"
+    },
+    "caring": {
+        "animation": "cmd:animate:hug",
+        "ttsfm_instruction": "Speak with warmth and compassion, gentle and reassuring"
+    },
+    "neutral": {
+        "animation": "cmd:animate:friendly",
+        "ttsfm_instruction": "Speak in a friendly, conversational tone"
+    }
+}
+
+# Flat views of EMOTION_TABLE for the per-response lookups
+_EMOTION_CMD = {emotion: entry["animation"] for emotion, entry in EMOTION_TABLE.items()}
+_EMOTION_INSTRUCTIONS = {emotion: entry["ttsfm_instruction"] for emotion, entry in EMOTION_TABLE.items()}
+
 class MoxieEmotionDetector:
     """Detect emotions from text for Moxie animations"""
     
@@ -37,22 +80,48 @@ class MoxieEmotionDetector:
         ]
     }
     
+    # One case-insensitive alternation per emotion, compiled once
+    _COMPILED = {
+        emotion: re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+        for emotion, patterns in EMOTION_PATTERNS.items()
+    }
+    
+    # First alphabetic run of every keyword, for a cheap "nothing to find" check
+    _KEYWORD_ROOTS = frozenset(
+        re.match(r"[a-z]+", word).group()
+        for patterns in EMOTION_PATTERNS.values()
+        for pattern in patterns if pattern.startswith(r"\b(")
+        for word in pattern[3:-3].split("|")
+    )
+    _WORDS = re.compile(r"[a-z]+")
+    
+    # Bytes versions of just the ASCII patterns, for ASCII-only text where the
+    # emoji alternatives cannot match and no Unicode case folding is needed
+    _COMPILED_ASCII = {
+        emotion: re.compile("|".join(f"(?:{p})" for p in patterns if p.isascii()).encode(), re.IGNORECASE)
+        for emotion, patterns in EMOTION_PATTERNS.items()
+    }
+    
     def detect_emotion(self, text: str) -> str:
         """Detect primary emotion from text"""
-        text_lower = text.lower()
-        emotion_scores = {}
+        if text.isascii():
+            # Plain ASCII text with no keyword and no repeated !/? cannot match any pattern
+            if ("!!" not in text and "??" not in text
+                    and self._KEYWORD_ROOTS.isdisjoint(self._WORDS.findall(text.lower()))):
+                return "neutral"
+            subject, regexes = text.encode("ascii"), self._COMPILED_ASCII
+        else:
+            # \b and IGNORECASE must see the real Unicode text here
+            subject, regexes = text, self._COMPILED
         
-        for emotion, patterns in self.EMOTION_PATTERNS.items():
-            score = 0
-            for pattern in patterns:
-                matches = re.findall(pattern, text_lower, re.IGNORECASE)
-                score += len(matches)
-            emotion_scores[emotion] = score
+        emotion_scores = {
+            emotion: sum(1 for _ in regex.finditer(subject))
+            for emotion, regex in regexes.items()
+        }
         
         # Get emotion with highest score
-        if max(emotion_scores.values()) > 0:
-            return max(emotion_scores, key=emotion_scores.get)
-        return "neutral"
+        best = max(emotion_scores, key=emotion_scores.get)
+        return best if emotion_scores[best] else "neutral"
 
 class MoxieContentFilter:
     """Filter content based on user mode (child/adult)"""
@@ -91,20 +160,12 @@ class MoxieContentFilter:
     
     def _ensure_friendly_tone(self, text: str) -> str:
         """Make sure the tone is friendly and appropriate for children"""
-        # Simple replacements for more child-friendly language
-        replacements = {
-            "I don't know": "That's a great question! Let me think about that",
-            "I can't": "Let's see what we can do instead",
-            "No": "Hmm, how about we try something else",
-            "That's wrong": "Let's try a different way",
-            "You're incorrect": "That's a good try! Here's another way to think about it"
-        }
-        
-        for old, new in replacements.items():
-            if text.startswith(old):
-                text = text.replace(old, new, 1)
+        # One C-level prefix probe; only look up the replacement on a hit
+        if not text.startswith(_FRIENDLY_PREFIXES):
+            return text
         
-        return text
+        old = next(prefix for prefix in _FRIENDLY_PREFIXES if text.startswith(prefix))
+        return _FRIENDLY_REPLACEMENTS[old] + text[len(old):]
 
 class MoxieResponseEnhancer:
     """Enhance Claude responses for Moxie"""
@@ -157,38 +218,26 @@ class MoxieResponseEnhancer:
     
     def _generate_moxie_commands(self, emotion: str, text: str) -> List[str]:
         """Generate Moxie-specific commands based on emotion and content"""
-        commands = []
-        
-        # Map emotions to Moxie animations/expressions
-        emotion_to_animation = {
-            "happy": "cmd:animate:joy",
-            "sad": "cmd:animate:sympathetic",
-            "curious": "cmd:animate:thinking",
-            "excited": "cmd:animate:celebrate",
-            "caring": "cmd:animate:hug",
-            "neutral": "cmd:animate:friendly"
-        }
-        
-        if emotion in emotion_to_animation:
-            commands.append(emotion_to_animation[emotion])
+        animation = _EMOTION_CMD.get(emotion)
         
         # Add pauses for longer text
         if len(text) > 200:
-            commands.append("cmd:pause:2")
-        
-        return commands
+            return [animation, "cmd:pause:2"] if animation else ["cmd:pause:2"]
+        return [animation] if animation else []
     
     def _get_emotion_instruction(self, emotion: str) -> str:
         """Get TTSFM emotion instruction"""
-        emotion_instructions = {
-            "happy": "Speak with joy and enthusiasm, upbeat and cheerful",
-            "sad": "Speak with a gentle, sympathetic tone, slightly slower",
-            "curious": "Speak with wonder and interest, rising intonation on questions",
-            "excited": "Speak with high energy and excitement, faster pace",
-            "caring": "Speak with warmth and compassion, gentle and reassuring",
-            "neutral": "Speak in a friendly, conversational tone"
-        }
-        return emotion_instructions.get(emotion, emotion_instructions["neutral"])
+        return _EMOTION_INSTRUCTIONS.get(emotion, _EMOTION_INSTRUCTIONS["neutral"])
+
+# Enhancers hold no per-request state, so one per mode lives for the whole process
+@functools.cache
+def _shared_enhancer(child_mode: bool) -> MoxieResponseEnhancer:
+    return MoxieResponseEnhancer(child_mode=child_mode)
+
+def get_enhancer(child_mode: bool = False) -> MoxieResponseEnhancer:
+    """Return the shared response enhancer for the given mode"""
+    # Normalise first so truthy request values share the two cached instances
+    return _shared_enhancer(bool(child_mode))
 
 def format_moxie_response(claude_response: str, enable_ttsfm: bool = False, child_mode: bool = False) -> Dict:
     """
@@ -202,7 +251,7 @@ def format_moxie_response(claude_response: str, enable_ttsfm: bool = False, chil
     Returns:
         Enhanced response dict suitable for Moxie
     """
-    enhancer = MoxieResponseEnhancer(child_mode=child_mode)
+    enhancer = get_enhancer(child_mode)
     enhanced = enhancer.enhance_response(claude_response, include_emotion=enable_ttsfm)
     
     # Build Moxie markup if commands exist
@@ -3,12 +3,13 @@
 Setup script to configure family members for Moxie
 """
 
-import requests
-import json
+import asyncio
+
+import httpx
 
 MOXIE_API = "http://localhost:8000"
 
-def setup_family_profiles():
+async def setup_family_profiles(client: httpx.AsyncClient):
     """Create user profiles for a typical family"""
     
     print("Setting up Moxie family profiles...")
@@ -27,12 +28,10 @@ def setup_family_profiles():
     
     all_users = adults + children
     
+    # One at a time: the server numbers ids in arrival order, so this keeps
+    # them the same on every run
     for user in all_users:
-        response = requests.post(
-            f"{MOXIE_API}/v1/moxie/users",
-            json=user
-        )
-        
+        response = await client.post("/v1/moxie/users", json=user)
         if response.status_code == 200:
             data = response.json()
             print(f"✓ Created profile for {user['name']} ({user['type']})")
@@ -48,17 +47,21 @@ def setup_family_profiles():
     print("- Children say: 'blue unicorn' or 'purple star'")
     print("="*50)
 
-def test_identification():
+async def test_identification(client: httpx.AsyncClient):
     """Test user identification"""
     
     print("\nTesting user identification...")
     
-    # Test voice-based identification (adult)
-    response = requests.post(
-        f"{MOXIE_API}/v1/moxie/identify",
-        json={"voice_features": {"pitch": 120}}
+    adult_voice, child_voice, code_word = await asyncio.gather(
+        # Test voice-based identification (adult)
+        client.post("/v1/moxie/identify", json={"voice_features": {"pitch": 120}}),
+        # Test voice-based identification (child)
+        client.post("/v1/moxie/identify", json={"voice_features": {"pitch": 250}}),
+        # Test code word identification
+        client.post("/v1/moxie/identify", json={"spoken_code": "blue unicorn"}),
     )
     
+    response = adult_voice
     if response.status_code == 200:
         data = response.json()
         print(f"\nAdult voice detected:")
@@ -66,12 +69,7 @@ def test_identification():
         print(f"- Mode: {'Child' if data['settings']['child_mode'] else 'Adult'}")
         print(f"- Confidence: {data['confidence']}")
     
-    # Test voice-based identification (child)
-    response = requests.post(
-        f"{MOXIE_API}/v1/moxie/identify",
-        json={"voice_features": {"pitch": 250}}
-    )
-    
+    response = child_voice
     if response.status_code == 200:
         data = response.json()
         print(f"\nChild voice detected:")
@@ -79,22 +77,17 @@ def test_identification():
         print(f"- Mode: {'Child' if data['settings']['child_mode'] else 'Adult'}")
         print(f"- Confidence: {data['confidence']}")
     
-    # Test code word identification
-    response = requests.post(
-        f"{MOXIE_API}/v1/moxie/identify",
-        json={"spoken_code": "blue unicorn"}
-    )
-    
+    response = code_word
     if response.status_code == 200:
         data = response.json()
         print(f"\nCode word 'blue unicorn' recognized:")
         print(f"- User: {data['user_profile']['name']}")
         print(f"- Mode: {'Child' if data['settings']['child_mode'] else 'Adult'}")
 
-def show_registered_users():
+async def show_registered_users(client: httpx.AsyncClient):
     """Display all registered users"""
     
-    response = requests.get(f"{MOXIE_API}/v1/moxie/users")
+    response = await client.get("/v1/moxie/users")
     
     if response.status_code == 200:
         data = response.json()
@@ -103,7 +96,11 @@ def show_registered_users():
         for user in data['users']:
             print(f"- {user['name']} ({user['type']}) - ID: {user['user_id']}")
 
+async def main():
+    async with httpx.AsyncClient(base_url=MOXIE_API) as client:
+        await setup_family_profiles(client)
+        await test_identification(client)
+        await show_registered_users(client)
+
 if __name__ == "__main__":
-    setup_family_profiles()
-    test_identification()
-    show_registered_users()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
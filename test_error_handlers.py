@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tests for the API error handlers in main.
+Runs without a server: pytest test_error_handlers.py
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+client = TestClient(main.app)
+
+OVERSIZED_INT_BODY = {
+    "model": "claude-3-5-sonnet-20241022",
+    "messages": [{"role": "user", "content": "Hi"}],
+    "temperature": 100000000000000000000000000,
+}
+
+
+@pytest.mark.parametrize("path", ["/v1/chat/completions", "/v1/compatibility"])
+def test_oversized_int_is_a_validation_error(path):
+    response = client.post(path, json=OVERSIZED_INT_BODY)
+
+    assert response.status_code == 422
+    details = response.json()["error"]["details"]
+    assert any(detail["field"].endswith("temperature") for detail in details)
+
+
+def test_debug_endpoint_accepts_oversized_int():
+    response = client.post("/v1/debug/request", json=OVERSIZED_INT_BODY)
+
+    assert response.status_code == 200
+    debug_info = response.json()["debug_info"]
+    assert debug_info["json_parse_error"] is None
+    assert debug_info["validation_result"]["valid"] is False
+    assert debug_info["validation_result"]["errors"][0]["field"] == "temperature"
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for Moxie profile storage in user_recognition.
+Runs without a server: pytest test_user_recognition.py
+"""
+
+import json
+import sqlite3
+
+from user_recognition import MoxieUserRecognition, UserType
+
+
+LEGACY_USERS = {
+    "adult_1": {"name": "Mom", "user_type": "adult", "face_id": "face_mom",
+                "voice_profile": {"avg_pitch": 180}},
+    "adult_2": {"name": "Dad", "user_type": "adult"},
+    "child_3": {"name": "Emma", "user_type": "child"},
+    "child_4": {"name": "Ghost", "user_type": "alien"},  # malformed: unknown type
+    "child_5": {"user_type": "child"},                    # malformed: no name
+}
+
+
+def _write_legacy(path):
+    with open(path / "users.json", "w") as f:
+        json.dump(LEGACY_USERS, f)
+
+
+def test_migrates_users_json_into_users_db(tmp_path):
+    _write_legacy(tmp_path)
+
+    recognition = MoxieUserRecognition(str(tmp_path))
+
+    assert list(recognition.profiles) == ["adult_1", "adult_2", "child_3"]
+    rows = sqlite3.connect(tmp_path / "users.db").execute(
+        "SELECT user_id FROM users ORDER BY rowid"
+    ).fetchall()
+    assert [row[0] for row in rows] == ["adult_1", "adult_2", "child_3"]
+
+
+def test_users_db_round_trip(tmp_path):
+    _write_legacy(tmp_path)
+    first = MoxieUserRecognition(str(tmp_path))
+    kid = first.create_profile("Liam", UserType.CHILD, voice_profile={"avg_pitch": 240})
+    first.identify_user_by_face("face_mom")
+    first._flush()
+
+    # users.json is only read when users.db is new
+    (tmp_path / "users.json").unlink()
+    second = MoxieUserRecognition(str(tmp_path))
+
+    assert set(second.profiles) == {"adult_1", "adult_2", "child_3", kid.user_id}
+    mom = second.profiles["adult_1"]
+    assert mom.name == "Mom"
+    assert mom.user_type is UserType.ADULT
+    assert mom.voice_profile == {"avg_pitch": 180}
+    assert mom.last_seen == first.profiles["adult_1"].last_seen
+    assert second.profiles[kid.user_id].voice_profile == {"avg_pitch": 240}
+    assert second.identify_user_by_face("face_mom") is mom
+    # Voice matching picks the first adult registered, not the most recently seen
+    assert second.identify_user_by_voice({"pitch": 100})[0] is mom
+
+
+def test_malformed_db_row_is_skipped(tmp_path):
+    _write_legacy(tmp_path)
+    MoxieUserRecognition(str(tmp_path))
+
+    db = sqlite3.connect(tmp_path / "users.db")
+    db.execute("UPDATE users SET voice_profile = x'c1' WHERE user_id = 'adult_2'")
+    db.commit()
+
+    recognition = MoxieUserRecognition(str(tmp_path))
+
+    assert set(recognition.profiles) == {"adult_1", "child_3"}
+
+
+def test_eviction_keeps_stored_profiles(tmp_path, monkeypatch):
+    _write_legacy(tmp_path)
+    monkeypatch.setenv("MOXIE_MAX_PROFILES", "1")
+
+    recognition = MoxieUserRecognition(str(tmp_path))
+
+    assert len(recognition.profiles) == 1
+    count = sqlite3.connect(tmp_path / "users.db").execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    assert count == 3
+
+
+def test_create_profile_reuse_is_opt_in_and_compares_voice(tmp_path):
+    recognition = MoxieUserRecognition(str(tmp_path))
+    emma = recognition.create_profile("Emma", UserType.CHILD, voice_profile={"avg_pitch": 250})
+
+    # Same name and no face id is still a different child by default
+    other = recognition.create_profile("Emma", UserType.CHILD, voice_profile={"avg_pitch": 250})
+    assert other is not emma
+
+    assert recognition.create_profile(
+        "Emma", UserType.CHILD, voice_profile={"avg_pitch": 250}, reuse_existing=True
+    ) is emma
+    assert recognition.create_profile(
+        "Emma", UserType.CHILD, voice_profile={"avg_pitch": 230}, reuse_existing=True
+    ) is not emma
+
+
+def test_evicted_profiles_are_identified_from_users_db(tmp_path, monkeypatch):
+    with open(tmp_path / "users.json", "w") as f:
+        json.dump({
+            "adult_user_1": {"name": "Mom", "user_type": "adult", "face_id": "face_mom"},
+            "child_user_1": {"name": "Emma", "user_type": "child"},
+            "adult_3": {"name": "Dad", "user_type": "adult"},
+        }, f)
+    monkeypatch.setenv("MOXIE_MAX_PROFILES", "1")
+    recognition = MoxieUserRecognition(str(tmp_path))
+    assert list(recognition.profiles) == ["adult_3"]
+
+    assert recognition.identify_user_by_face("face_mom").name == "Mom"
+    assert recognition.identify_user_by_code("blue unicorn").name == "Emma"
+    assert recognition.get_profile("adult_3").name == "Dad"
+    # Voice still resolves to the first adult created, even once evicted
+    assert recognition.identify_user_by_voice({"pitch": 100})[0].name == "Mom"
+    assert len(recognition.profiles) == 1
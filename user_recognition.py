@@ -3,80 +3,243 @@ User recognition system for Moxie to identify adults vs children
 """
 
 import os
-import json
+import time
+import sqlite3
+import weakref
+import atexit
+import asyncio
 import logging
-from typing import Dict, Optional, Tuple
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, TypedDict
+from datetime import timedelta
 from enum import Enum
+from types import MappingProxyType
+
+import msgspec
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Seconds to coalesce profile mutations before rewriting the store
+SAVE_DELAY = 2.0
+
+# Pitch (Hz) above which a voice is bucketed as a child's
+CHILD_PITCH_THRESHOLD = 200.0
+
+# Simple code-based identification
+_CODE_TO_USER_ID = {
+    "red dragon": "adult_user_1",
+    "blue unicorn": "child_user_1",
+    "green robot": "adult_user_2",
+    "purple star": "child_user_2"
+}
+_USER_ID_TO_CODE = {user_id: code for code, user_id in _CODE_TO_USER_ID.items()}
+
 class UserType(Enum):
     CHILD = "child"
     ADULT = "adult"
     UNKNOWN = "unknown"
 
+# Stored value -> member, skipping the Enum lookup machinery on load
+_USER_TYPE_MAP = {member.value: member for member in UserType}
+
+class VoiceFeatures(TypedDict, total=False):
+    """Voice characteristics sent with an identification request"""
+    pitch: float  # Hz
+    formants: Tuple[float, ...]
+
 class UserProfile:
     """Represents a Moxie user profile"""
+    __slots__ = ('user_id', 'name', 'user_type', 'type_value', 'voice_profile', 'face_id',
+                 'last_seen', 'preferences', '_interaction_mode', '__weakref__')
+    
     def __init__(self, user_id: str, name: str, user_type: UserType, 
                  voice_profile: Optional[Dict] = None, face_id: Optional[str] = None):
         self.user_id = user_id
         self.name = name
         self.user_type = user_type
+        # user_type.value, read without going through the Enum property
+        self.type_value = user_type.value
         self.voice_profile = voice_profile
         self.face_id = face_id
-        self.last_seen = datetime.now()
+        self.last_seen = time.time()  # epoch seconds
         self.preferences = {}
+        # Memoized read-only settings from get_interaction_mode
+        self._interaction_mode = None
+
+# voice_profile / preferences columns are msgpack BLOBs
+_ENCODER = msgspec.msgpack.Encoder()
+# Key order independent encoding, for comparing voice profiles
+_SORTED_ENCODER = msgspec.msgpack.Encoder(order="sorted")
+_BLOB_DECODER = msgspec.msgpack.Decoder()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    user_type TEXT NOT NULL,
+    voice_profile BLOB,
+    face_id TEXT,
+    last_seen REAL NOT NULL,
+    preferences BLOB
+)
+"""
+_FACE_INDEX = "CREATE INDEX IF NOT EXISTS users_face_id ON users (face_id)"
+# rowid order is creation order: upserts update in place rather than re-insert
+_SELECT_ALL = ("SELECT user_id, name, user_type, voice_profile, face_id, last_seen, preferences "
+               "FROM users ORDER BY rowid")
+_UPSERT = """
+INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    name = excluded.name,
+    user_type = excluded.user_type,
+    voice_profile = excluded.voice_profile,
+    face_id = excluded.face_id,
+    last_seen = excluded.last_seen,
+    preferences = excluded.preferences
+"""
+_UPDATE_LAST_SEEN = "UPDATE users SET last_seen = ? WHERE user_id = ?"
+_EXISTS = "SELECT 1 FROM users WHERE user_id = ?"
+# Fallbacks for profiles evicted from memory
+_SELECT_BY_ID = ("SELECT user_id, name, user_type, voice_profile, face_id, last_seen, preferences "
+                 "FROM users WHERE user_id = ?")
+_SELECT_BY_FACE = ("SELECT user_id, name, user_type, voice_profile, face_id, last_seen, preferences "
+                   "FROM users WHERE face_id = ? ORDER BY rowid LIMIT 1")
+
+def _profile_row(profile: "UserProfile") -> Tuple:
+    """Column values for one users row"""
+    return (
+        profile.user_id,
+        profile.name,
+        profile.type_value,
+        _ENCODER.encode(profile.voice_profile),
+        profile.face_id,
+        profile.last_seen,
+        _ENCODER.encode(profile.preferences),
+    )
+
+def _profile_from_row(row: Tuple) -> "UserProfile":
+    """Build a profile from a users row; raises KeyError/DecodeError if malformed"""
+    user_id, name, user_type, voice_profile, face_id, last_seen, preferences = row
+    profile = UserProfile(
+        user_id=user_id,
+        name=name,
+        user_type=_USER_TYPE_MAP[user_type],
+        voice_profile=_BLOB_DECODER.decode(voice_profile) if voice_profile else None,
+        face_id=face_id
+    )
+    if preferences:
+        profile.preferences = _BLOB_DECODER.decode(preferences)
+    profile.last_seen = last_seen
+    return profile
+
+def _fingerprint(name: str, user_type: "UserType", voice_profile: Optional[Dict],
+                 face_id: Optional[str]) -> Tuple:
+    """Identity of a profile's creation fields, for spotting repeat creates"""
+    return (name, user_type, face_id, _SORTED_ENCODER.encode(voice_profile))
 
 class MoxieUserRecognition:
     """Handles user recognition and profile management for Moxie"""
     
     def __init__(self, profiles_path: str = "/app/profiles"):
         self.profiles_path = profiles_path
-        self.profiles: Dict[str, UserProfile] = {}
-        self.current_user: Optional[UserProfile] = None
+        # Kept in least- to most-recently-seen order so eviction pops from the front
+        self.profiles: "OrderedDict[str, UserProfile]" = OrderedDict()
+        self.max_profiles = int(os.getenv("MOXIE_MAX_PROFILES", "1000"))
+        ttl_days = float(os.getenv("MOXIE_PROFILE_TTL_DAYS", "0"))
+        self.profile_ttl = ttl_days * 86400 if ttl_days > 0 else None
+        # Lookup indexes kept in step with self.profiles; a miss falls back to
+        # users.db, which still holds evicted profiles
+        self._by_face_id: Dict[str, UserProfile] = {}
+        self._code_to_profile: Dict[str, UserProfile] = {}
+        # _fingerprint(...) -> first profile created with those fields
+        self._profile_fingerprints: Dict[Tuple, UserProfile] = {}
+        # First profile ever created of each type, for voice matching. Rows are
+        # never deleted, so this survives eviction and is resolved by id
+        self._first_of_type: Dict[UserType, str] = {}
+        # Weak so an evicted profile is not kept alive as the current user
+        self._current_user_ref: Optional["weakref.ReferenceType[UserProfile]"] = None
+        # Pending writes by user id: full rows and last_seen-only updates. These
+        # hold the profile itself so one evicted before the flush is still saved
+        self._dirty: Dict[str, UserProfile] = {}
+        self._seen: Dict[str, UserProfile] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._db = self._open_store()
         self.load_profiles()
+        atexit.register(self._flush)
+    
+    def _open_store(self) -> sqlite3.Connection:
+        """Open users.db, remembering whether it had to be created"""
+        os.makedirs(self.profiles_path, exist_ok=True)
+        db_file = os.path.join(self.profiles_path, "users.db")
+        self._new_store = not os.path.exists(db_file)
+        # Autocommit; _flush groups its statements in an explicit transaction
+        db = sqlite3.connect(db_file, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(_SCHEMA)
+        db.execute(_FACE_INDEX)
+        return db
     
     def load_profiles(self):
         """Load user profiles from storage"""
-        os.makedirs(self.profiles_path, exist_ok=True)
-        profiles_file = os.path.join(self.profiles_path, "users.json")
+        if self._new_store:
+            self._migrate_profiles()
+            return
         
-        if os.path.exists(profiles_file):
+        try:
+            rows = self._db.execute(_SELECT_ALL).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error loading profiles: {e}")
+            return
+        for row in rows:
             try:
-                with open(profiles_file, 'r') as f:
-                    data = json.load(f)
-                    for user_id, profile_data in data.items():
-                        self.profiles[user_id] = UserProfile(
-                            user_id=user_id,
-                            name=profile_data['name'],
-                            user_type=UserType(profile_data['user_type']),
-                            voice_profile=profile_data.get('voice_profile'),
-                            face_id=profile_data.get('face_id')
-                        )
-                logger.info(f"Loaded {len(self.profiles)} user profiles")
-            except Exception as e:
-                logger.error(f"Error loading profiles: {e}")
+                profile = _profile_from_row(row)
+            except (KeyError, msgspec.DecodeError) as e:
+                logger.warning(f"Skipping malformed profile {row[0]}: {e!r}")
+                continue
+            self._add_profile(profile)
+        # Rows come back in creation order; self.profiles is kept by recency
+        self.profiles = OrderedDict(sorted(self.profiles.items(), key=lambda item: item[1].last_seen))
+        self._evict_profiles()
+        logger.info(f"Loaded {len(self.profiles)} user profiles")
     
-    def save_profiles(self):
-        """Save user profiles to storage"""
-        profiles_file = os.path.join(self.profiles_path, "users.json")
-        data = {}
+    def _migrate_profiles(self):
+        """One-shot import into a new users.db from the old users.json"""
+        legacy_file = os.path.join(self.profiles_path, "users.json")
+        if not os.path.exists(legacy_file):
+            return
         
-        for user_id, profile in self.profiles.items():
-            data[user_id] = {
-                'name': profile.name,
-                'user_type': profile.user_type.value,
-                'voice_profile': profile.voice_profile,
-                'face_id': profile.face_id,
-                'last_seen': profile.last_seen.isoformat(),
-                'preferences': profile.preferences
-            }
+        try:
+            with open(legacy_file, 'rb') as f:
+                data = orjson.loads(f.read())
+        except Exception as e:
+            logger.error(f"Error loading profiles: {e}")
+            return
+        for user_id, profile_data in data.items():
+            try:
+                profile = UserProfile(
+                    user_id=user_id,
+                    name=profile_data['name'],
+                    user_type=_USER_TYPE_MAP[profile_data['user_type']],
+                    voice_profile=profile_data.get('voice_profile'),
+                    face_id=profile_data.get('face_id')
+                )
+            except (KeyError, TypeError, AttributeError) as e:
+                logger.warning(f"Skipping malformed profile {user_id}: {e!r}")
+                continue
+            self._add_profile(profile)
         
-        with open(profiles_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        self.save_profiles()
+        self._evict_profiles()
+        logger.info(f"Migrated {len(self.profiles)} user profiles from users.json")
+    
+    def save_profiles(self):
+        """Write every in-memory profile to the store"""
+        self._dirty.update(self.profiles)
+        self._flush()
     
-    def identify_user_by_voice(self, voice_features: Dict) -> Tuple[Optional[UserProfile], float]:
+    def identify_user_by_voice(self, voice_features: VoiceFeatures) -> Tuple[Optional[UserProfile], float]:
         """
         Identify user by voice characteristics
         Returns: (user_profile, confidence_score)
@@ -85,98 +248,241 @@ class MoxieUserRecognition:
         # For now, we'll use a simple mock based on pitch
         pitch = voice_features.get('pitch', 0)
         
-        # Simple heuristic: higher pitch often indicates younger/child voices
-        if pitch > 200:  # Hz - typical child voice range
-            # Look for matching child profile
-            for profile in self.profiles.values():
-                if profile.user_type == UserType.CHILD:
-                    return profile, 0.8
-        else:
-            # Look for matching adult profile
-            for profile in self.profiles.values():
-                if profile.user_type == UserType.ADULT:
-                    return profile, 0.8
+        # Simple heuristic: higher pitch often indicates younger/child voices;
+        # take the first profile registered of that type
+        user_id = self._first_of_type.get(UserType.CHILD if pitch > CHILD_PITCH_THRESHOLD else UserType.ADULT)
+        if user_id is not None:
+            profile = self.get_profile(user_id)
+            if profile:
+                return profile, 0.8
         
         return None, 0.0
     
     def identify_user_by_face(self, face_id: str) -> Optional[UserProfile]:
         """Identify user by face recognition ID from Moxie's camera"""
-        for profile in self.profiles.values():
-            if profile.face_id == face_id:
-                profile.last_seen = datetime.now()
-                return profile
-        return None
+        profile = self._by_face_id.get(face_id) or self._load_stored(_SELECT_BY_FACE, face_id)
+        if profile:
+            self._touch(profile)
+            self._evict_profiles()
+        return profile
     
     def identify_user_by_code(self, code: str) -> Optional[UserProfile]:
         """Identify user by spoken code/password"""
-        # Simple code-based identification
-        code_to_user = {
-            "red dragon": "adult_user_1",
-            "blue unicorn": "child_user_1",
-            "green robot": "adult_user_2",
-            "purple star": "child_user_2"
-        }
-        
-        user_id = code_to_user.get(code.lower())
-        if user_id and user_id in self.profiles:
-            profile = self.profiles[user_id]
-            profile.last_seen = datetime.now()
-            return profile
-        return None
+        code = code.lower()
+        profile = self._code_to_profile.get(code)
+        if profile is None and code in _CODE_TO_USER_ID:
+            profile = self._load_stored(_SELECT_BY_ID, _CODE_TO_USER_ID[code])
+        if profile:
+            self._touch(profile)
+            self._evict_profiles()
+        return profile
+    
+    def get_profile(self, user_id: str) -> Optional[UserProfile]:
+        """Look up a profile by id, reloading it from the store if it was evicted"""
+        profile = self.profiles.get(user_id)
+        if profile is None:
+            profile = self._load_stored(_SELECT_BY_ID, user_id)
+            if profile is not None:
+                self._evict_profiles()
+        return profile
+    
+    def _load_stored(self, query: str, key: str) -> Optional[UserProfile]:
+        """Bring an evicted profile back into memory from users.db"""
+        # Evicted profiles can still have writes pending; land them first
+        if self._dirty or self._seen:
+            self._flush()
+        try:
+            row = self._db.execute(query, (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error loading profile: {e}")
+            return None
+        if row is None:
+            return None
+        if row[0] in self.profiles:
+            return self.profiles[row[0]]
+        try:
+            profile = _profile_from_row(row)
+        except (KeyError, msgspec.DecodeError) as e:
+            logger.warning(f"Skipping malformed profile {row[0]}: {e!r}")
+            return None
+        self._add_profile(profile)
+        return profile
+    
+    def find_duplicate(self, name: str, user_type: UserType,
+                       voice_profile: Optional[Dict] = None,
+                       face_id: Optional[str] = None) -> Optional[UserProfile]:
+        """Return a loaded profile created with exactly these fields, if any"""
+        return self._profile_fingerprints.get(_fingerprint(name, user_type, voice_profile, face_id))
     
     def create_profile(self, name: str, user_type: UserType, 
                       voice_profile: Optional[Dict] = None, 
-                      face_id: Optional[str] = None) -> UserProfile:
-        """Create a new user profile"""
-        user_id = f"{user_type.value}_{len(self.profiles) + 1}"
+                      face_id: Optional[str] = None,
+                      reuse_existing: bool = False) -> UserProfile:
+        """
+        Create a new user profile
+        With reuse_existing, a profile with identical name, type, voice profile
+        and face id is returned instead of creating another
+        """
+        if reuse_existing:
+            existing = self.find_duplicate(name, user_type, voice_profile, face_id)
+            if existing is not None:
+                return existing
+        
+        # Evicted profiles stay in the store, so skip ids taken there too
+        number = len(self.profiles) + 1
+        while self._id_taken(f"{user_type.value}_{number}"):
+            number += 1
+        user_id = f"{user_type.value}_{number}"
         profile = UserProfile(user_id, name, user_type, voice_profile, face_id)
-        self.profiles[user_id] = profile
-        self.save_profiles()
+        self._add_profile(profile)
+        self._dirty[user_id] = profile
+        self._evict_profiles()
+        self._schedule_save()
         return profile
     
-    def get_interaction_mode(self, user_profile: Optional[UserProfile] = None) -> Dict:
+    def _id_taken(self, user_id: str) -> bool:
+        """Whether a user id is in memory, pending a write, or already stored"""
+        if user_id in self.profiles or user_id in self._dirty:
+            return True
+        return self._db.execute(_EXISTS, (user_id,)).fetchone() is not None
+    
+    def _touch(self, profile: UserProfile):
+        """Mark a profile as just seen and move it to the recent end"""
+        profile.last_seen = time.time()
+        self.profiles.move_to_end(profile.user_id)
+        self._seen[profile.user_id] = profile
+        self._schedule_save()
+    
+    def _schedule_save(self):
+        """Write pending changes once after a burst of mutations"""
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts, tests) - write straight away
+            self._flush()
+            return
+        self._flush_handle = loop.call_later(SAVE_DELAY, self._flush)
+    
+    def _flush(self):
+        """Write the rows that changed since the last save"""
+        self._flush_handle = None
+        if not (self._dirty or self._seen):
+            return
+        upserts = [_profile_row(profile) for profile in self._dirty.values()]
+        seen = [(profile.last_seen, user_id) for user_id, profile in self._seen.items()
+                if user_id not in self._dirty]
+        try:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(_UPSERT, upserts)
+                self._db.executemany(_UPDATE_LAST_SEEN, seen)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        except sqlite3.Error as e:
+            # Keep the pending changes; the next save or exit retries them
+            logger.error(f"Error saving profiles: {e}")
+            return
+        self._dirty.clear()
+        self._seen.clear()
+    
+    def _evict_profiles(self):
+        """Unload profiles idle past the TTL, then the least recently seen over the cap
+
+        Only the in-memory copy goes; the store keeps every profile.
+        """
+        if self.profile_ttl is not None:
+            cutoff = time.time() - self.profile_ttl
+            while self.profiles and next(iter(self.profiles.values())).last_seen < cutoff:
+                self._remove_profile(self.profiles.popitem(last=False)[1])
+        while len(self.profiles) > self.max_profiles:
+            self._remove_profile(self.profiles.popitem(last=False)[1])
+    
+    def _add_profile(self, profile: UserProfile):
+        """Store a profile and index it"""
+        self.profiles[profile.user_id] = profile
+        self._first_of_type.setdefault(profile.user_type, profile.user_id)
+        self._profile_fingerprints.setdefault(
+            _fingerprint(profile.name, profile.user_type, profile.voice_profile, profile.face_id), profile
+        )
+        code = _USER_ID_TO_CODE.get(profile.user_id)
+        if code:
+            self._code_to_profile[code] = profile
+        if profile.face_id:
+            # First profile registered for a face wins, as the old scan did
+            self._by_face_id.setdefault(profile.face_id, profile)
+    
+    def _remove_profile(self, profile: UserProfile):
+        """Drop an already-removed profile from the indexes"""
+        fingerprint = _fingerprint(profile.name, profile.user_type, profile.voice_profile, profile.face_id)
+        if self._profile_fingerprints.get(fingerprint) is profile:
+            del self._profile_fingerprints[fingerprint]
+        code = _USER_ID_TO_CODE.get(profile.user_id)
+        if code:
+            self._code_to_profile.pop(code, None)
+        if profile.face_id and self._by_face_id.get(profile.face_id) is profile:
+            del self._by_face_id[profile.face_id]
+            # Hand the face over to any other profile sharing it
+            for other in self.profiles.values():
+                if other.face_id == profile.face_id:
+                    self._by_face_id[profile.face_id] = other
+                    break
+    
+    # Child-safe settings used when the user is unknown
+    _DEFAULT_MODE = MappingProxyType({
+        "child_mode": True,
+        "content_filter": "strict",
+        "voice_speed": "normal",
+        "complexity": "simple"
+    })
+    # Per-type settings; user_name is added per profile
+    _CHILD_MODE_TEMPLATE = {
+        "child_mode": True,
+        "content_filter": "strict",
+        "voice_speed": "slightly_slow",
+        "complexity": "simple",
+        "encourage_learning": True
+    }
+    _ADULT_MODE_TEMPLATE = {
+        "child_mode": False,
+        "content_filter": "none",
+        "voice_speed": "normal",
+        "complexity": "full"
+    }
+    
+    def get_interaction_mode(self, user_profile: Optional[UserProfile] = None) -> MappingProxyType:
         """
         Determine interaction settings based on user profile
-        Returns dict with settings for the interaction
+        Returns a read-only mapping with settings for the interaction
         """
         if not user_profile:
             # Default to child-safe mode when user unknown
-            return {
-                "child_mode": True,
-                "content_filter": "strict",
-                "voice_speed": "normal",
-                "complexity": "simple"
-            }
+            return self._DEFAULT_MODE
         
-        if user_profile.user_type == UserType.CHILD:
-            return {
-                "child_mode": True,
-                "content_filter": "strict",
-                "voice_speed": "slightly_slow",
-                "complexity": "simple",
-                "encourage_learning": True,
-                "user_name": user_profile.name
-            }
-        else:  # ADULT
-            return {
-                "child_mode": False,
-                "content_filter": "none",
-                "voice_speed": "normal",
-                "complexity": "full",
-                "user_name": user_profile.name
-            }
+        if user_profile._interaction_mode is not None:
+            return user_profile._interaction_mode
+        
+        template = (self._CHILD_MODE_TEMPLATE if user_profile.user_type is UserType.CHILD
+                    else self._ADULT_MODE_TEMPLATE)
+        user_profile._interaction_mode = MappingProxyType({**template, "user_name": user_profile.name})
+        return user_profile._interaction_mode
     
     def update_current_user(self, user_profile: Optional[UserProfile]):
         """Update the current active user"""
-        self.current_user = user_profile
+        self._current_user_ref = weakref.ref(user_profile) if user_profile else None
         if user_profile:
-            logger.info(f"Current user set to: {user_profile.name} ({user_profile.user_type.value})")
+            logger.info(f"Current user set to: {user_profile.name} ({user_profile.type_value})")
         else:
             logger.info("No active user")
     
     def get_current_user(self) -> Optional[UserProfile]:
         """Get the current active user"""
-        return self.current_user
+        return self._current_user_ref() if self._current_user_ref else None
+    
+    current_user = property(get_current_user)
 
 
 # Integration with OpenMoxie
@@ -187,55 +493,85 @@ class MoxieSessionManager:
         self.user_recognition = MoxieUserRecognition()
         self.session_timeout = timedelta(minutes=30)
         self.last_activity = {}
+        # (request key, handler) pairs tried in order by start_session
+        self._id_methods = (
+            ('voice_features', self._id_voice),
+            ('face_id', self._id_face),
+            ('spoken_code', self._id_code),
+            ('user_id', self._id_direct),
+        )
+    
+    def _id_voice(self, voice_features: VoiceFeatures) -> Tuple[Optional[UserProfile], float]:
+        return self.user_recognition.identify_user_by_voice(voice_features)
+    
+    def _id_face(self, face_id: str) -> Tuple[Optional[UserProfile], float]:
+        user_profile = self.user_recognition.identify_user_by_face(face_id)
+        return user_profile, 0.9 if user_profile else 0.0
+    
+    def _id_code(self, spoken_code: str) -> Tuple[Optional[UserProfile], float]:
+        user_profile = self.user_recognition.identify_user_by_code(spoken_code)
+        return user_profile, 1.0 if user_profile else 0.0
+    
+    def _id_direct(self, user_id: str) -> Tuple[Optional[UserProfile], float]:
+        user_profile = self.user_recognition.get_profile(user_id)
+        return user_profile, 1.0 if user_profile else 0.0
     
     def start_session(self, identification_data: Dict) -> Dict:
         """
         Start a new Moxie session with user identification
         
         identification_data can contain:
-        - voice_features: Dict with voice characteristics
+        - voice_features: VoiceFeatures dict with voice characteristics
         - face_id: String face recognition ID
         - spoken_code: String code/password
         - user_id: Direct user ID
         """
-        user_profile = None
-        confidence = 0.0
-        
-        # Try different identification methods
-        if 'voice_features' in identification_data:
-            user_profile, confidence = self.user_recognition.identify_user_by_voice(
-                identification_data['voice_features']
-            )
-        
-        if not user_profile and 'face_id' in identification_data:
-            user_profile = self.user_recognition.identify_user_by_face(
-                identification_data['face_id']
-            )
-            confidence = 0.9 if user_profile else 0.0
-        
-        if not user_profile and 'spoken_code' in identification_data:
-            user_profile = self.user_recognition.identify_user_by_code(
-                identification_data['spoken_code']
-            )
-            confidence = 1.0 if user_profile else 0.0
-        
-        if not user_profile and 'user_id' in identification_data:
-            user_profile = self.user_recognition.profiles.get(identification_data['user_id'])
-            confidence = 1.0 if user_profile else 0.0
+        user_profile, confidence = self._identify(identification_data)
         
         # Update current user
         self.user_recognition.update_current_user(user_profile)
         
+        return self._session_result(f"moxie_{time.time_ns()}", user_profile, confidence)
+    
+    def start_sessions_batch(self, batch: List[Dict]) -> List[Dict]:
+        """
+        Identify many sessions at once, e.g. when replaying session logs
+        
+        Each entry takes the same keys as start_session. The current user is
+        left unchanged.
+        """
+        identify = self._identify
+        session_result = self._session_result
+        prefix = f"moxie_{time.time_ns()}"
+        return [
+            session_result(f"{prefix}_{index}", *identify(identification_data))
+            for index, identification_data in enumerate(batch)
+        ]
+    
+    def _identify(self, identification_data: Dict) -> Tuple[Optional[UserProfile], float]:
+        """Try identification methods in priority order until one matches"""
+        user_profile = None
+        confidence = 0.0
+        for key, identify in self._id_methods:
+            if key in identification_data:
+                user_profile, confidence = identify(identification_data[key])
+                if user_profile:
+                    break
+        return user_profile, confidence
+    
+    def _session_result(self, session_id: str, user_profile: Optional[UserProfile],
+                        confidence: float) -> Dict:
+        """Response body for one identified session"""
         # Get interaction settings
         settings = self.user_recognition.get_interaction_mode(user_profile)
         
         return {
-            "session_id": f"moxie_{datetime.now().timestamp()}",
+            "session_id": session_id,
             "user_profile": {
                 "user_id": user_profile.user_id if user_profile else None,
                 "name": user_profile.name if user_profile else "Friend",
-                "type": user_profile.user_type.value if user_profile else "unknown"
+                "type": user_profile.type_value if user_profile else "unknown"
             },
             "confidence": confidence,
-            "settings": settings
-        }
\ No newline at end of file
+            "settings": dict(settings)
+        }